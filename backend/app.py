@@ -1,27 +1,18 @@
 from flask import Flask, render_template, request
-from google.cloud import storage
 from crypto_utils import generate_dh_keys, derive_shared_key, encrypt_file_aes, decrypt_file_aes , serialize_public_key , deserialize_public_key , derive_file_key
 from flask import send_file
 import io
 from functools import wraps
 from flask import request
 from auth_utils import verify_token
-from ocr_utils import extract_text_from_bytes,extract_text_from_pdf_gcs
+from ocr_utils import extract_text_from_bytes,extract_text_from_pdf
 from classifier import classify_document
 from db_utils import save_metadata
-from dotenv import load_dotenv
-import os
+from resources import get_bucket
 
-load_dotenv()
-BUCKET_NAME = os.getenv("BUCKET_NAME")
 app = Flask(__name__)
 
 
-storage_client = storage.Client()  #client init()
-bucket = storage_client.bucket(BUCKET_NAME)
-
-SERVER_PRIVATE_KEY, SERVER_PUBLIC_KEY = generate_dh_keys()
-
 def require_auth(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
@@ -52,6 +43,7 @@ def index():
 @app.route("/upload", methods=["POST"])
 @require_auth
 def upload_file():
+    bucket = get_bucket()
     file = request.files["file"]
     raw_data = file.read()
 
@@ -66,25 +58,15 @@ def upload_file():
 
     
     if filename_lower.endswith((".png", ".jpg", ".jpeg")):
-       extracted_text = extract_text_from_bytes(decrypted_data)
+        extracted_text = extract_text_from_bytes(decrypted_data)
 
     elif filename_lower.endswith(".pdf"):
-
-    # 1️⃣ Upload TEMP plaintext PDF
-         temp_blob = bucket.blob("temp/" + file.filename)
-         temp_blob.upload_from_string(raw_data, content_type="application/pdf")
-
-    # 2️⃣ OCR from temp GCS PDF
-         extracted_text = extract_text_from_pdf_gcs(
-        f"gs://{BUCKET_NAME}/temp/{file.filename}"
-        )
-
-    # 3️⃣ Delete temp PDF immediately
-         temp_blob.delete()
+        # Text layer read locally; only scanned pages go to Vision
+        extracted_text = extract_text_from_pdf(pdf_bytes=raw_data)
 
     else:
-       extracted_text = ""
-    
+        extracted_text = ""
+
     # try:
     #    extracted_text = extract_text_from_bytes(raw_data)
     # except Exception as e:
@@ -111,6 +93,7 @@ def upload_file():
 
 @app.route("/download/<filename>")
 def download_file(filename):
+    bucket = get_bucket()
 
     client_private, client_public = generate_dh_keys()
     blob = bucket.get_blob(filename + ".enc") #access doc from cloud
@@ -128,7 +111,8 @@ def download_file(filename):
     # client_pub_bytes = metadata["client_pub"].encode() #required to gain access to metadata
     # client_public = deserialize_public_key(client_pub_bytes)
 
-    # aes_key = derive_shared_key(SERVER_PRIVATE_KEY, client_public)
+    # server_private, _ = generate_dh_keys()
+    # aes_key = derive_shared_key(server_private, client_public)
     
     aes_key = derive_file_key(filename)
 
@@ -1,14 +1,9 @@
-import firebase_admin
-from firebase_admin import credentials, auth
-import os
-from dotenv import load_dotenv
-from google.cloud import firestore
-load_dotenv()
-# Initialize Firebase Admin ONLY ONCE
-cred = credentials.Certificate(os.getenv("FIREBASE_CREDENTIALS_PATH"))
-firebase_admin.initialize_app(cred)
-db = firestore.Client(project="securedocai")
+from resources import get_resource
+
 def save_metadata(filename, category, text, user_id):
+    from google.cloud import firestore
+
+    db = get_resource("firestore")
     db.collection("documents").add({
         "filename": filename,
         "category": category,
@@ -19,5 +14,8 @@ def save_metadata(filename, category, text, user_id):
 
 
 def verify_token(id_token):
+    from firebase_admin import auth
+
+    get_resource("firebase_app")
     decoded = auth.verify_id_token(id_token)
     return decoded["uid"]
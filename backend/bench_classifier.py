@@ -0,0 +1,161 @@
+"""
+Classifier benchmark: model load time and documents per second.
+
+Reports
+  - cold start of a process that classifies with the rules (the model
+    libraries must not be imported)
+  - cold start plus model load, memory-mapped and fully read
+  - documents per second for the rules, the model one document at a time
+    and the model in batches
+
+Uses the artifacts in --model-dir, or with --synthetic trains a small model
+on generated documents first (the artifacts are written to a temp dir).
+
+Usage:
+    python bench_classifier.py [--model-dir models | --synthetic] [--docs 2000]
+                               [--batch 256] [--json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+LOAD_SNIPPET = """
+import os, sys, time
+start = time.perf_counter()
+import classifier
+classifier.classify_document("warm up text for the benchmark, long enough")
+elapsed = time.perf_counter() - start
+print(elapsed, "sklearn" in sys.modules)
+"""
+
+
+def make_corpus(count, rng):
+    from classifier import RULES
+
+    filler = [
+        "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 8)))
+        for _ in range(2000)
+    ]
+
+    texts, labels = [], []
+    for i in range(count):
+        label, keywords, _ = RULES[i % len(RULES)]
+        words = [rng.choice(filler) for _ in range(rng.randint(80, 300))]
+        for _ in range(rng.randint(2, 6)):
+            words.insert(rng.randrange(len(words)), rng.choice(keywords))
+        texts.append(" ".join(words))
+        labels.append(label)
+    return texts, labels
+
+
+def train_synthetic(model_dir, rng):
+    import joblib
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from classifier import MODEL_FILE, VECTORIZER_FILE
+
+    texts, labels = make_corpus(2000, rng)
+    vectorizer = TfidfVectorizer(max_features=5000, stop_words="english")
+    model = LogisticRegression(max_iter=1000, class_weight="balanced")
+    model.fit(vectorizer.fit_transform(texts), labels)
+
+    joblib.dump(vectorizer, os.path.join(model_dir, VECTORIZER_FILE))
+    joblib.dump(model, os.path.join(model_dir, MODEL_FILE))
+
+
+def cold_start(env):
+    proc = subprocess.run(
+        [sys.executable, "-c", LOAD_SNIPPET],
+        cwd=BACKEND_DIR, env={**os.environ, **env},
+        capture_output=True, text=True, check=True
+    )
+    elapsed, sklearn_loaded = proc.stdout.split()
+    return float(elapsed), sklearn_loaded == "True"
+
+
+def throughput(func, texts):
+    start = time.perf_counter()
+    func(texts)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark classifier loading and throughput")
+    parser.add_argument("--model-dir", default=None)
+    parser.add_argument("--synthetic", action="store_true", help="train a small model on generated documents")
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    temp_dir = None
+    model_dir = args.model_dir
+    if args.synthetic:
+        temp_dir = tempfile.TemporaryDirectory()
+        model_dir = temp_dir.name
+        train_synthetic(model_dir, rng)
+
+    env = {"CLASSIFIER_MODE": "model"}
+    if model_dir:
+        env["CLASSIFIER_MODEL_DIR"] = os.path.abspath(model_dir)
+
+    rules_seconds, rules_sklearn = cold_start({"CLASSIFIER_MODE": "rules"})
+    model_seconds, _ = cold_start(env)
+
+    os.environ.update(env)
+    import classifier
+    from resources import get_resource
+
+    # Load without memory mapping for comparison (sklearn already imported)
+    import joblib
+    start = time.perf_counter()
+    for name in (classifier.VECTORIZER_FILE, classifier.MODEL_FILE):
+        joblib.load(os.path.join(os.environ.get("CLASSIFIER_MODEL_DIR", classifier.MODEL_DIR), name))
+    full_load = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loaded = get_resource("classifier_model")
+    mmap_load = time.perf_counter() - start
+    if loaded is None:
+        print(json.dumps({"error": "No model artifacts; pass --model-dir or --synthetic"}))
+        return 1
+
+    texts, _ = make_corpus(args.docs, rng)
+
+    def batched(texts):
+        for i in range(0, len(texts), args.batch):
+            classifier.classify_many(texts[i:i + args.batch])
+
+    report = {
+        "rules_cold_start_ms": round(rules_seconds * 1000, 1),
+        "rules_imports_sklearn": rules_sklearn,
+        "model_cold_start_ms": round(model_seconds * 1000, 1),
+        "model_load_mmap_ms": round(mmap_load * 1000, 1),
+        "model_load_full_ms": round(full_load * 1000, 1),
+        "rules_docs_per_s": round(throughput(lambda t: [classifier.classify_by_rules(x) for x in t], texts)),
+        "model_single_docs_per_s": round(throughput(lambda t: [classifier.classify_document(x) for x in t], texts)),
+        "model_batched_docs_per_s": round(throughput(batched, texts)),
+    }
+
+    if args.json:
+        print(json.dumps(report))
+    else:
+        for key, value in report.items():
+            print(f"{key:28} {value}")
+
+    if temp_dir:
+        temp_dir.cleanup()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
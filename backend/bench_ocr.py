@@ -0,0 +1,101 @@
+"""
+OCR throughput benchmark against the fake Vision backend.
+
+Compares the old call pattern (a new client and one request per image)
+with the pooled client and batched annotate_images, and checks that
+batched results come back in input order with per-item errors.
+
+Usage:
+    python bench_ocr.py [--images 64] [--size 200000] [--fail-every 0] [--json]
+
+Latency of the fake backend is set with FAKE_VISION_CONNECT_MS,
+FAKE_VISION_REQUEST_MS and FAKE_VISION_IMAGE_MS (see fake_vision.py).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+os.environ["VISION_BACKEND"] = "fake"
+
+import ocr_utils
+from fake_vision import FakeVisionClient, fake_text
+from resources import reset_resources
+
+
+def make_images(count, size, fail_every):
+    images = []
+    for i in range(count):
+        prefix = b"FAIL" if fail_every and (i + 1) % fail_every == 0 else b"IMG"
+        body = f"{prefix.decode()}-{i}-".encode()
+        images.append((body * (size // len(body) + 1))[:size])
+    return images
+
+
+def legacy(images):
+    # What extract_text_from_bytes used to do for every image
+    texts = []
+    for image in images:
+        client = FakeVisionClient()
+        response = client.batch_annotate_images(
+            requests=[{"image": {"content": image}, "features": [{"type_": "TEXT_DETECTION"}]}]
+        ).responses[0]
+        texts.append(None if response.error.message else response.text_annotations[0].description)
+    return texts
+
+
+def batched(images):
+    return ocr_utils.annotate_images(images, feature="TEXT_DETECTION")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pooled, batched Vision OCR")
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--size", type=int, default=200000, help="bytes per image")
+    parser.add_argument("--fail-every", type=int, default=0, help="make every Nth image fail")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    images = make_images(args.images, args.size, args.fail_every)
+
+    start = time.perf_counter()
+    expected = legacy(images)
+    legacy_seconds = time.perf_counter() - start
+
+    reset_resources()
+    start = time.perf_counter()
+    results = batched(images)
+    batched_seconds = time.perf_counter() - start
+
+    client = ocr_utils.get_vision_client()
+
+    # Same texts, same order, errors on the same items
+    for image, want, got in zip(images, expected, results):
+        if want is None:
+            assert got["error"], "expected a per-item error"
+        else:
+            assert got["error"] is None and got["text"] == want == fake_text(image)
+
+    report = {
+        "images": args.images,
+        "image_bytes": args.size,
+        "errors": sum(1 for r in results if r["error"]),
+        "legacy_seconds": round(legacy_seconds, 3),
+        "batched_seconds": round(batched_seconds, 3),
+        "batched_requests": client.requests,
+        "speedup": round(legacy_seconds / batched_seconds, 1) if batched_seconds else None,
+    }
+
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    print(f"{args.images} images of {args.size} bytes ({report['errors']} failing)")
+    print(f"  legacy   {legacy_seconds:8.3f}s  ({args.images} clients, {args.images} requests)")
+    print(f"  batched  {batched_seconds:8.3f}s  (1 client, {client.requests} requests)")
+    print(f"  speedup  {report['speedup']}x")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+PDF redaction benchmark over synthetic, PII-dense statements.
+
+Times pdf_redactor.redact_pdf against the previous implementation (kept
+below as legacy_redact_pdf, one re.findall per pattern and a search_for
+per match) and checks how much PII is left in each output's text layer
+and how much other text was blacked out with it.
+
+With --workers N, the same documents are also redacted by N worker
+processes and checked to render the same pages as the serial run.
+
+Usage:
+    python bench_redaction.py [--pages 10 100 300] [--lines 45] [--runs 1]
+                              [--seed 7] [--workers 4] [--json]
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import hashlib
+import tempfile
+import fitz  # PyMuPDF
+from pdf_redactor import redact_pdf
+from pii_pattern import PII_PATTERNS, find_pii
+
+
+# -----------------------------
+# Previous implementation, for comparison
+# -----------------------------
+def legacy_redact_pdf(input_pdf_path, output_pdf_path):
+    doc = fitz.open(input_pdf_path)
+
+    for page in doc:
+        page_text = page.get_text("text")
+
+        for label, pattern in PII_PATTERNS.items():
+            matches = re.findall(pattern, page_text)
+
+            for match in matches:
+                match_str = match if isinstance(match, str) else match[0]
+
+                text_instances = page.search_for(match_str)
+
+                if not text_instances:
+                    continue
+
+                for inst in text_instances:
+                    page.add_redact_annot(inst, fill=(0, 0, 0))
+
+        page.apply_redactions()
+
+    doc.save(output_pdf_path)
+    doc.close()
+
+
+# -----------------------------
+# Synthetic statements
+# -----------------------------
+def make_line(rng):
+    digits = lambda n: "".join(rng.choice("0123456789") for _ in range(n))
+    name = rng.choice(["Asha", "Ravi", "Meera", "Arjun", "Kavya", "Rohan"])
+
+    return rng.choice([
+        lambda: f"Contact {name.lower()}.{digits(3)}@example.com for queries",
+        lambda: f"Mobile +91 {rng.choice('6789')}{digits(9)} registered to {name}",
+        lambda: f"Aadhaar {digits(4)} {digits(4)} {digits(4)} verified",
+        lambda: f"Passport {rng.choice('JKLMNPRSTZ')}{digits(7)} valid till 2031",
+        lambda: f"Date of birth {digits(2)}/{digits(2)}/19{digits(2)} on record",
+        lambda: f"Txn ref {digits(6)} amount {digits(4)}.{digits(2)} INR credited",
+        lambda: f"Order {digits(10)}X shipped to {name}",
+    ])()
+
+
+def make_pdf(path, pages, lines, rng):
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        text = "\n".join(make_line(rng) for _ in range(lines))
+        page.insert_textbox(fitz.Rect(40, 40, 560, 800), text, fontsize=9)
+    doc.save(path)
+    doc.close()
+
+
+def leftover(path):
+    """
+    Returns (PII matches still in the text layer, characters of text left).
+    """
+    doc = fitz.open(path)
+    try:
+        text = "".join(page.get_text("text") for page in doc)
+    finally:
+        doc.close()
+
+    non_space = sum(not c.isspace() for c in text)
+    return sum(1 for _ in find_pii(text)), non_space
+
+
+def page_signature(path):
+    """
+    Rendered pixels and text of every page, to compare two outputs.
+    """
+    doc = fitz.open(path)
+    try:
+        return [
+            (hashlib.sha256(page.get_pixmap(dpi=50).samples).hexdigest(), page.get_text("text"))
+            for page in doc
+        ]
+    finally:
+        doc.close()
+
+
+def timed(runs, func, *args):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF redaction")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 300])
+    parser.add_argument("--lines", type=int, default=45, help="text lines per page")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--workers", type=int, default=0, help="also time parallel redaction")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            source = os.path.join(tmp, f"statement_{pages}.pdf")
+            legacy_out = os.path.join(tmp, f"legacy_{pages}.pdf")
+            new_out = os.path.join(tmp, f"new_{pages}.pdf")
+            make_pdf(source, pages, args.lines, rng)
+
+            legacy_seconds = timed(args.runs, legacy_redact_pdf, source, legacy_out)
+            new_seconds = timed(args.runs, redact_pdf, source, new_out, 1)
+
+            legacy_left, legacy_chars = leftover(legacy_out)
+            new_left, new_chars = leftover(new_out)
+
+            rows.append({
+                "pages": pages,
+                "legacy_s": round(legacy_seconds, 3),
+                "new_s": round(new_seconds, 3),
+                "speedup": round(legacy_seconds / new_seconds, 2) if new_seconds else None,
+                "legacy_pii_left": legacy_left,
+                "new_pii_left": new_left,
+                "legacy_chars_kept": legacy_chars,
+                "new_chars_kept": new_chars,
+            })
+
+            if args.workers:
+                parallel_out = os.path.join(tmp, f"parallel_{pages}.pdf")
+                parallel_seconds = timed(args.runs, redact_pdf, source, parallel_out, args.workers)
+                rows[-1].update({
+                    "parallel_s": round(parallel_seconds, 3),
+                    "parallel_speedup": round(new_seconds / parallel_seconds, 2) if parallel_seconds else None,
+                    "parallel_same": page_signature(parallel_out) == page_signature(new_out),
+                })
+
+    if args.json:
+        print(json.dumps({"runs": rows}))
+    else:
+        print(f"{'pages':>6} {'legacy s':>9} {'new s':>8} {'speedup':>8} "
+              f"{'PII left (legacy/new)':>22} {'chars kept (legacy/new)':>24}")
+        for row in rows:
+            print(f"{row['pages']:>6} {row['legacy_s']:>9} {row['new_s']:>8} {row['speedup']:>7}x "
+                  f"{row['legacy_pii_left']:>11}/{row['new_pii_left']:<10} "
+                  f"{row['legacy_chars_kept']:>11}/{row['new_chars_kept']:<12}")
+
+        if args.workers:
+            print(f"\n{args.workers} workers:")
+            for row in rows:
+                print(f"{row['pages']:>6} pages: {row['new_s']}s serial, {row['parallel_s']}s parallel "
+                      f"({row['parallel_speedup']}x, same pages: {row['parallel_same']})")
+
+    failed = any(row["new_pii_left"] or not row.get("parallel_same", True) for row in rows)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
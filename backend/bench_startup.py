@@ -0,0 +1,140 @@
+"""
+Cold-start benchmark for the backend entry points.
+
+Each entry point is imported in fresh interpreters (nothing is executed, the
+scripts are guarded by __main__) and the script reports:
+
+  - wall time of `python -c "import <module>"` minus bare interpreter start-up
+  - the cumulative import cost reported by `python -X importtime`
+  - the heaviest modules pulled in, by self time
+
+Usage:
+    python bench_startup.py [--runs 5] [--top 5] [--budget-ms 300] [--json]
+
+With --budget-ms the exit status is 1 when any entry point goes over budget,
+so import-time regressions fail loudly.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ENTRY_POINTS = [
+    "main",
+    "bulk_ingest",
+    "list_metadat",
+    "list_shared_metadata",
+    "sharing",
+    "delete_user_file",
+    "download_user_file",
+    "download_shared_data",
+    "get_summary",
+    "redact_user_file",
+    "worker",
+    "app",
+]
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_python(code, importtime=False):
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ["-X", "importtime"]
+    cmd += ["-c", code]
+
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=BACKEND_DIR, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+
+    return elapsed, proc
+
+
+def parse_importtime(stderr):
+    """
+    Returns [(module, self_us, cumulative_us)] from -X importtime output.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        rows.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    return rows
+
+
+def bench_entry_point(module, runs, top, baseline):
+    walls = []
+    for _ in range(runs):
+        elapsed, proc = run_python(f"import {module}")
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed"
+            return {"module": module, "error": error}
+        walls.append(elapsed)
+
+    _, proc = run_python(f"import {module}", importtime=True)
+    rows = parse_importtime(proc.stderr)
+
+    cumulative_us = next((c for name, _, c in rows if name == module), 0)
+    heaviest = sorted(rows, key=lambda r: r[1], reverse=True)[:top]
+
+    wall_ms = statistics.median(walls) * 1000
+    return {
+        "module": module,
+        "wall_ms": round(wall_ms, 1),
+        "import_ms": round(max(wall_ms - baseline, 0.0), 1),
+        "importtime_ms": round(cumulative_us / 1000, 1),
+        "heaviest": [
+            {"module": name, "self_ms": round(self_us / 1000, 1)}
+            for name, self_us, _ in heaviest
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import cost of backend entry points")
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    baseline = statistics.median(run_python("pass")[0] for _ in range(args.runs)) * 1000
+    results = [bench_entry_point(m, args.runs, args.top, baseline) for m in args.modules]
+
+    over_budget = [
+        r["module"] for r in results
+        if args.budget_ms is not None and r.get("import_ms", 0) > args.budget_ms
+    ]
+
+    if args.json:
+        print(json.dumps({
+            "interpreter_ms": round(baseline, 1),
+            "results": results,
+            "over_budget": over_budget,
+        }, indent=2))
+    else:
+        print(f"interpreter start-up: {baseline:.1f} ms (median of {args.runs})")
+        print(f"{'entry point':<24}{'wall ms':>10}{'import ms':>11}{'-X importtime':>15}")
+        for r in results:
+            if "error" in r:
+                print(f"{r['module']:<24}  ERROR: {r['error']}")
+                continue
+            print(f"{r['module']:<24}{r['wall_ms']:>10.1f}{r['import_ms']:>11.1f}{r['importtime_ms']:>15.1f}")
+            for h in r["heaviest"]:
+                print(f"{'':<28}{h['self_ms']:>8.1f} ms  {h['module']}")
+
+        for module in over_budget:
+            print(f"OVER BUDGET: {module} exceeds {args.budget_ms} ms")
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Summarizer benchmark over synthetic documents of 1 to 1000 pages.
+
+Times summarizer.summarize_text against the previous implementation (kept
+below as legacy_summarize_text) and checks both return the same summary.
+With --stream, also compares peak memory of summarize_text on the joined
+text with summarize_pages fed one page at a time.
+
+Usage:
+    python bench_summarizer.py [--pages 1 10 100 1000] [--runs 3] [--seed 7]
+                               [--stream 2000] [--json]
+"""
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from collections import defaultdict
+from summarizer import summarize_pages, summarize_text
+
+SENTENCES_PER_PAGE = 40
+
+
+# -----------------------------
+# Previous implementation, for comparison
+# -----------------------------
+def legacy_split_sentences(text):
+    return re.split(r'(?<=[.!?])\s+', text.strip())
+
+
+def legacy_is_redundant(sentence, selected_sentences):
+    sent_words = set(sentence.lower().split())
+
+    for s in selected_sentences:
+        overlap = sent_words & set(s.lower().split())
+        if sent_words and (len(overlap) / len(sent_words)) > 0.6:
+            return True
+
+    return False
+
+
+def legacy_summarize_text(text, max_sentences=3):
+    if not text or len(text) < 100:
+        return text
+
+    sentences = legacy_split_sentences(text)
+
+    if len(sentences) <= max_sentences:
+        return text
+
+    word_freq = defaultdict(int)
+
+    words = re.findall(r'\b[a-zA-Z]{3,}\b', text.lower())
+    for word in words:
+        word_freq[word] += 1
+
+    if not word_freq:
+        return text
+
+    max_freq = max(word_freq.values())
+    for word in word_freq:
+        word_freq[word] /= max_freq
+
+    sentence_scores = {}
+
+    for idx, sentence in enumerate(sentences):
+        sentence_words = re.findall(r'\b[a-zA-Z]{3,}\b', sentence.lower())
+        if not sentence_words:
+            continue
+
+        word_score = sum(word_freq.get(word, 0) for word in sentence_words)
+        avg_word_score = word_score / len(sentence_words)
+
+        position_weight = 1 / (idx + 1)
+
+        sentence_scores[sentence] = avg_word_score + position_weight
+
+    if not sentence_scores:
+        return text
+
+    ranked_sentences = sorted(
+        sentence_scores,
+        key=sentence_scores.get,
+        reverse=True
+    )
+
+    selected = []
+
+    for sent in ranked_sentences:
+        if not legacy_is_redundant(sent, selected):
+            selected.append(sent)
+        if len(selected) == max_sentences:
+            break
+
+    return " ".join(s for s in sentences if s in selected)
+
+
+# -----------------------------
+# Synthetic OCR-like documents
+# -----------------------------
+def make_pages(pages, rng):
+    """
+    Yields the pages of a synthetic document one at a time.
+    """
+    vocabulary = [
+        "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(3, 9)))
+        for _ in range(3000)
+    ]
+    boilerplate = [
+        "Page footer confidential.",
+        "Signed by the authorised officer.",
+        "Total amount due 1,250.00 INR.",
+    ]
+
+    for _ in range(pages):
+        sentences = []
+        for _ in range(SENTENCES_PER_PAGE):
+            if rng.random() < 0.05:
+                # Repeated headers and footers, as OCR output has
+                sentences.append(rng.choice(boilerplate))
+                continue
+
+            words = [rng.choice(vocabulary) for _ in range(rng.randint(4, 20))]
+            words[0] = words[0].capitalize()
+            if rng.random() < 0.1:
+                words.append(str(rng.randint(1, 9999)))
+            sentences.append(" ".join(words) + rng.choice(".!?"))
+
+        yield " ".join(sentences) + "\n"
+
+
+def make_document(pages, rng):
+    return "".join(make_pages(pages, rng))
+
+
+def peak_memory(func, *args):
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        return tracemalloc.get_traced_memory()[1], result
+    finally:
+        tracemalloc.stop()
+
+
+def compare_streaming(pages, seed):
+    """
+    Peak memory of summarize_text on the joined text against
+    summarize_pages on a page generator, for the same document.
+    """
+    joined_peak, expected = peak_memory(
+        lambda: summarize_text(make_document(pages, random.Random(seed)))
+    )
+    stream_peak, summary = peak_memory(
+        lambda: summarize_pages(make_pages(pages, random.Random(seed)))
+    )
+    return {
+        "pages": pages,
+        "joined_peak_mb": round(joined_peak / 1e6, 1),
+        "streaming_peak_mb": round(stream_peak / 1e6, 1),
+        "same_output": summary == expected,
+    }
+
+
+def best_of(runs, func, *args):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the extractive summarizer")
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--stream", type=int, metavar="PAGES", help="also compare streaming memory use")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = []
+    mismatches = 0
+
+    for pages in args.pages:
+        text = make_document(pages, rng)
+
+        legacy_seconds, expected = best_of(args.runs, legacy_summarize_text, text)
+        new_seconds, summary = best_of(args.runs, summarize_text, text)
+
+        same = summary == expected
+        mismatches += not same
+        rows.append({
+            "pages": pages,
+            "chars": len(text),
+            "legacy_ms": round(legacy_seconds * 1000, 2),
+            "new_ms": round(new_seconds * 1000, 2),
+            "speedup": round(legacy_seconds / new_seconds, 2) if new_seconds else None,
+            "same_output": same,
+        })
+
+    streaming = compare_streaming(args.stream, args.seed) if args.stream else None
+
+    if args.json:
+        print(json.dumps({"runs": rows, "streaming": streaming}))
+    else:
+        print(f"{'pages':>6} {'chars':>10} {'legacy ms':>10} {'new ms':>10} {'speedup':>8}  same")
+        for row in rows:
+            print(f"{row['pages']:>6} {row['chars']:>10} {row['legacy_ms']:>10} "
+                  f"{row['new_ms']:>10} {row['speedup']:>7}x  {row['same_output']}")
+
+        if streaming:
+            print(f"\nstreaming, {streaming['pages']} pages: peak "
+                  f"{streaming['joined_peak_mb']} MB joined vs {streaming['streaming_peak_mb']} MB "
+                  f"page by page (same summary: {streaming['same_output']})")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,347 @@
+"""
+Bulk ingest: uploads many files for one user in a single process.
+
+Files go through a staged pipeline
+
+    ocr (read + OCR) -> classify -> summarize -> upload (encrypt + upload) -> index
+
+PDFs are summarized page by page in the ocr stage, as their pages are read;
+the summarize stage handles the rest.
+
+Each stage has its own worker threads, and the stages are connected by
+bounded queues, so a slow stage holds back the ones before it instead of
+piling up files in memory. The manifest is updated in batches rather than
+once per file.
+
+Every finished file is appended to a JSONL checkpoint. Running the same
+command again skips files that are already uploaded, so an interrupted run
+resumes where it stopped. Progress is streamed to stdout as JSON lines; the
+per-file step messages go to stderr.
+
+Usage:
+    python bulk_ingest.py <user_id> <dir | glob | file>... [--list FILE]
+        [--checkpoint PATH] [--ocr-workers 4] [--classify-workers 1]
+        [--summarize-workers 1] [--upload-workers 4] [--queue-size 16]
+        [--index-batch 100]
+"""
+import os
+import sys
+import glob
+import json
+import time
+import queue
+import argparse
+import threading
+import traceback
+from classifier import classify_document
+from main import find_duplicate, ocr_file, store_file
+from manifest import get_manifest, update_manifest
+from resources import get_bucket
+from summary_store import build_summary, is_current
+
+SUPPORTED_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg")
+
+_DONE = object()
+
+
+# -----------------------------
+# Inputs
+# -----------------------------
+def collect_files(sources, list_file=None):
+    """
+    Expands directories (recursively), glob patterns and a file list into
+    absolute paths, without duplicates, in a stable order.
+    """
+    paths = []
+
+    for source in sources:
+        if os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                paths += [
+                    os.path.join(root, name) for name in sorted(files)
+                    if name.lower().endswith(SUPPORTED_EXTENSIONS)
+                ]
+        elif os.path.isfile(source):
+            paths.append(source)
+        else:
+            paths += sorted(
+                path for path in glob.glob(source, recursive=True)
+                if os.path.isfile(path) and path.lower().endswith(SUPPORTED_EXTENSIONS)
+            )
+
+    if list_file:
+        with open(list_file, encoding="utf-8") as f:
+            paths += [line.strip() for line in f if line.strip()]
+
+    seen = set()
+    unique = []
+    for path in map(os.path.abspath, paths):
+        if path not in seen:
+            seen.add(path)
+            unique.append(path)
+    return unique
+
+
+# -----------------------------
+# Checkpoint
+# -----------------------------
+def load_checkpoint(path):
+    """
+    Returns {file path: status} from an existing checkpoint.
+    """
+    statuses = {}
+    if not os.path.exists(path):
+        return statuses
+
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Torn last line from an interrupted run
+                continue
+            statuses[entry["path"]] = entry["status"]
+
+    return statuses
+
+
+class Checkpoint:
+
+    def __init__(self, path):
+        self._file = open(path, "a", encoding="utf-8")
+
+    def record(self, path, status):
+        self._file.write(json.dumps({"path": path, "status": status}) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+# -----------------------------
+# Pipeline
+# -----------------------------
+def run_stage(name, func, workers, inbox, outbox):
+    """
+    Starts `workers` threads that apply `func` to items from `inbox` and pass
+    them on to `outbox`. A failed item carries its error and stage name and
+    is passed on untouched by later stages.
+    """
+    remaining = [workers]
+    lock = threading.Lock()
+
+    def work():
+        try:
+            while True:
+                item = inbox.get()
+                if item is _DONE:
+                    # Let sibling workers see the end too
+                    inbox.put(_DONE)
+                    return
+
+                if "error" not in item:
+                    try:
+                        func(item)
+                    except BaseException as e:
+                        # Also SystemExit and the like: the item fails, the
+                        # worker keeps going
+                        traceback.print_exc()
+                        item["error"] = str(e) or type(e).__name__
+                        item["stage"] = name
+
+                outbox.put(item)
+        finally:
+            # The last worker out tells the next stage, however it exits,
+            # so the index loop never waits forever
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    outbox.put(_DONE)
+
+    threads = [
+        threading.Thread(target=work, name=f"{name}-{i}", daemon=True)
+        for i in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def bulk_ingest(user_id, paths, checkpoint_path, out=sys.stdout,
+                ocr_workers=4, classify_workers=1, summarize_workers=1, upload_workers=4,
+                queue_size=16, index_batch=100):
+    """
+    Ingests `paths` for `user_id`. Returns the summary that is also written
+    as the last progress line.
+    """
+    def emit(event):
+        out.write(json.dumps(event) + "\n")
+        out.flush()
+
+    start = time.perf_counter()
+    previous = load_checkpoint(checkpoint_path)
+    todo = [path for path in paths if previous.get(path) not in ("uploaded", "indexed")]
+    # Uploaded by an interrupted run but possibly never added to the manifest
+    unindexed = any(status == "uploaded" for status in previous.values())
+
+    emit({"event": "start", "total": len(todo), "skipped": len(paths) - len(todo)})
+
+    # 1️⃣ Stage functions
+    def ocr(item):
+        item["digest"], item["ocr_digest"], duplicate = find_duplicate(item["path"], user_id)
+        if duplicate:
+            # Identical content already stored: no OCR or classification
+            item["text"] = duplicate["text"]
+            item["category"] = duplicate["category"]
+            summary = duplicate.get("summary")
+            # Without the full text an outdated summary is left to get_summary
+            item["summary"] = summary if is_current(summary) else None
+            item["deduplicated"] = True
+            return
+        item["text"], summary = ocr_file(item["path"], os.path.basename(item["path"]), item["ocr_digest"])
+        if summary is not None:
+            # PDFs are summarized while they are read
+            item["summary"] = summary
+
+    def classify(item):
+        if "category" not in item:
+            item["category"] = classify_document(item["text"])
+
+    def summarize(item):
+        if "summary" not in item:
+            item["summary"] = build_summary(item["text"])
+
+    def upload(item):
+        # A file an interrupted run already uploaded is finished, not failed
+        item["metadata"] = store_file(
+            item["path"], user_id, item["category"], item["text"], item["digest"],
+            item["ocr_digest"], summary=item["summary"], update_index=False, resume=True
+        )
+        # The extracted text is not needed past this point
+        del item["text"]
+
+    # 2️⃣ Queues between stages; bounded for backpressure
+    queues = [queue.Queue(maxsize=max(1, queue_size)) for _ in range(5)]
+    run_stage("ocr", ocr, max(1, ocr_workers), queues[0], queues[1])
+    run_stage("classify", classify, max(1, classify_workers), queues[1], queues[2])
+    run_stage("summarize", summarize, max(1, summarize_workers), queues[2], queues[3])
+    run_stage("upload", upload, max(1, upload_workers), queues[3], queues[4])
+
+    def feed():
+        for path in todo:
+            queues[0].put({"path": path})
+        queues[0].put(_DONE)
+
+    threading.Thread(target=feed, name="feed", daemon=True).start()
+
+    # 3️⃣ Index stage: record results and update the manifest in batches
+    bucket = get_bucket()
+    checkpoint = Checkpoint(checkpoint_path)
+    pending = {}
+    uploaded = deduplicated = failed = 0
+
+    def flush():
+        if not pending:
+            return
+        batch = dict(pending)
+        if update_manifest(bucket, user_id, lambda manifest: manifest["documents"].update(
+            {item["metadata"]["filename"]: item["metadata"] for item in batch.values()}
+        ), pending=[item["metadata"]["filename"] for item in batch.values()]) is not None:
+            for path in batch:
+                checkpoint.record(path, "indexed")
+        pending.clear()
+
+    try:
+        while True:
+            item = queues[4].get()
+            if item is _DONE:
+                break
+
+            event = {"event": "file", "path": item["path"]}
+            if "error" in item:
+                failed += 1
+                checkpoint.record(item["path"], "failed")
+                event.update({"status": "failed", "stage": item["stage"], "error": item["error"]})
+            else:
+                uploaded += 1
+                deduplicated += item.get("deduplicated", False)
+                checkpoint.record(item["path"], "uploaded")
+                pending[item["path"]] = item
+                event.update({
+                    "status": "uploaded",
+                    "filename": item["metadata"]["filename"],
+                    "category": item["metadata"]["category"],
+                    "deduplicated": item.get("deduplicated", False),
+                })
+
+            event.update({"uploaded": uploaded, "failed": failed, "total": len(todo)})
+            emit(event)
+
+            if len(pending) >= index_batch:
+                flush()
+
+        flush()
+    finally:
+        checkpoint.close()
+
+    if unindexed:
+        # Rebuild from the meta blobs, which include the files an earlier
+        # run uploaded but did not get to index
+        get_manifest(bucket, user_id, refresh=True)
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        "event": "done",
+        "uploaded": uploaded,
+        "deduplicated": deduplicated,
+        "failed": failed,
+        "skipped": len(paths) - len(todo),
+        "seconds": round(elapsed, 3),
+        "files_per_second": round(uploaded / elapsed, 2) if elapsed else None,
+    }
+    emit(summary)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload many files for one user")
+    parser.add_argument("user_id")
+    parser.add_argument("sources", nargs="*", help="directories, glob patterns or files")
+    parser.add_argument("--list", dest="list_file", help="file with one path per line")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: bulk_ingest_<user_id>.jsonl)")
+    parser.add_argument("--ocr-workers", type=int, default=4)
+    parser.add_argument("--classify-workers", type=int, default=1)
+    parser.add_argument("--summarize-workers", type=int, default=1)
+    parser.add_argument("--upload-workers", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=16)
+    parser.add_argument("--index-batch", type=int, default=100)
+    args = parser.parse_args()
+
+    paths = collect_files(args.sources, args.list_file)
+    if not paths:
+        print(json.dumps({"error": "No files to ingest"}))
+        sys.exit(1)
+
+    # Progress lines own stdout; step messages from the stages go to stderr
+    out = sys.stdout
+    sys.stdout = sys.stderr
+
+    summary = bulk_ingest(
+        args.user_id,
+        paths,
+        args.checkpoint or f"bulk_ingest_{args.user_id}.jsonl",
+        out=out,
+        ocr_workers=args.ocr_workers,
+        classify_workers=args.classify_workers,
+        summarize_workers=args.summarize_workers,
+        upload_workers=args.upload_workers,
+        queue_size=args.queue_size,
+        index_batch=args.index_batch,
+    )
+
+    sys.exit(1 if summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+Content-addressed storage: identical uploads share one encrypted copy.
+
+    cas/<digest>.enc    the document, container format, key derived from
+                        MASTER_SECRET and the digest
+    cas/<digest>.refs   encrypted JSON entry: the object names referring to
+                        the content, its size, generation and the OCR text
+                        and category computed when it was first uploaded,
+                        and the digest its OCR results are cached under
+    documents/<uid>/<filename>.enc
+                        an empty reference object, metadata {"cas": digest}
+
+digest is an HMAC-SHA256 of the plaintext under a key derived from
+MASTER_SECRET, so object names do not reveal or confirm contents. A user
+only reaches content through their own reference objects. By default the
+key is per user, so only a user's own uploads are deduplicated.
+CAS_SCOPE=global deduplicates across users, at the price of telling an
+uploader that someone else already has the same file (the upload is
+instant). The OCR cache is keyed the same way, and its entries are
+deleted with the content they belong to.
+
+References are counted by object name. Adding a reference happens before
+the reference object is written and removing one after it is deleted, so
+a crash can leak content but never leave a reference without content.
+"""
+import os
+import hmac
+import json
+import hashlib
+import threading
+from crypto_utils import derive_file_key, encrypt_file_aes, decrypt_file_aes
+from resources import get_env
+from storage_utils import upload_encrypted_file
+
+CAS_PREFIX = "cas/"
+MAX_UPDATE_ATTEMPTS = 10
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_stats_lock = threading.Lock()
+_stats = {"lookups": 0, "hits": 0, "ocr_calls_saved": 0, "bytes_saved": 0}
+
+
+def hmac_key(purpose, user_id):
+    """
+    Key for content digests; per user unless CAS_SCOPE=global.
+    """
+    if get_env("CAS_SCOPE", "user") == "global":
+        return derive_file_key(f"{purpose}:hmac")
+    return derive_file_key(f"{purpose}:hmac:{user_id}")
+
+
+def file_digests(file_path, user_id):
+    """
+    Returns (CAS digest, OCR cache digest) of a file, from one read.
+    """
+    hashers = [
+        hmac.new(hmac_key("cas", user_id), digestmod=hashlib.sha256),
+        hmac.new(hmac_key("ocr-cache", user_id), digestmod=hashlib.sha256),
+    ]
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            for hasher in hashers:
+                hasher.update(chunk)
+    return tuple(hasher.hexdigest() for hasher in hashers)
+
+
+def content_path(digest):
+    return f"{CAS_PREFIX}{digest}.enc"
+
+
+def refs_path(digest):
+    return f"{CAS_PREFIX}{digest}.refs"
+
+
+def content_key(digest):
+    return derive_file_key(f"cas:{digest}")
+
+
+def is_reference(blob):
+    return bool(blob.metadata and "cas" in blob.metadata)
+
+
+def resolve(bucket, blob, filename):
+    """
+    Returns (blob, key) for the object holding a document's data: the shared
+    content for a reference, `blob` itself otherwise. `blob.metadata` must
+    already be loaded.
+    """
+    if not is_reference(blob):
+        return blob, derive_file_key(filename)
+
+    digest = blob.metadata["cas"]
+    content = bucket.get_blob(content_path(digest))
+    if content is None:
+        raise FileNotFoundError(f"Content missing for {filename}")
+    return content, content_key(digest)
+
+
+def ocr_digest(bucket, blob):
+    """
+    Returns the OCR cache digest recorded for a reference's content, or
+    None (not a reference, or stored before digests were recorded).
+    """
+    if not is_reference(blob):
+        return None
+
+    try:
+        entry, _ = load_refs(bucket, blob.metadata["cas"])
+    except Exception:
+        return None
+    return entry.get("ocr_digest") if entry else None
+
+
+# -----------------------------
+# Reference entries
+# -----------------------------
+def load_refs(bucket, digest):
+    """
+    Returns (entry, generation); entry is None and generation 0 when there
+    is no entry.
+    """
+    blob = bucket.get_blob(refs_path(digest))
+    if blob is None:
+        return None, 0
+
+    encrypted = blob.download_as_bytes(if_generation_match=blob.generation)
+    entry = json.loads(decrypt_file_aes(
+        encrypted,
+        derive_file_key(f"cas-refs:{digest}"),
+        bytes.fromhex(blob.metadata["iv"])
+    ).decode("utf-8"))
+    return entry, blob.generation
+
+
+def save_refs(bucket, digest, entry, generation):
+    encrypted, iv = encrypt_file_aes(
+        json.dumps(entry).encode("utf-8"),
+        derive_file_key(f"cas-refs:{digest}")
+    )
+
+    blob = bucket.blob(refs_path(digest))
+    blob.metadata = {"iv": iv.hex()}
+    blob.upload_from_string(encrypted, if_generation_match=generation)
+    return blob.generation
+
+
+def lookup(bucket, digest):
+    """
+    Returns the entry for content that is stored and referenced, or None.
+    """
+    try:
+        entry, _ = load_refs(bucket, digest)
+    except Exception:
+        entry = None
+
+    found = entry is not None and bool(entry["refs"])
+    with _stats_lock:
+        _stats["lookups"] += 1
+        if found:
+            _stats["hits"] += 1
+            _stats["ocr_calls_saved"] += 1
+    return entry if found else None
+
+
+def add_reference(bucket, name, digest):
+    """
+    Adds `name` as a reference to stored content. Returns the entry, or
+    None when the content is not stored (or is being deleted).
+    """
+    from google.api_core.exceptions import PreconditionFailed
+
+    for _ in range(MAX_UPDATE_ATTEMPTS):
+        entry, generation = load_refs(bucket, digest)
+        if entry is None or not entry["refs"]:
+            return None
+
+        if name not in entry["refs"]:
+            entry["refs"].append(name)
+            entry["reuses"] = entry.get("reuses", 0) + 1
+
+        try:
+            save_refs(bucket, digest, entry, generation)
+            return entry
+        except PreconditionFailed:
+            continue
+
+    raise RuntimeError(f"Too many concurrent updates to {refs_path(digest)}")
+
+
+def store_content(bucket, name, digest, file_path, analysis):
+    """
+    Uploads `file_path` as the content for `digest` with `name` as its first
+    reference. If another upload stored it meanwhile, `name` is added to
+    that one instead. Returns the entry.
+    """
+    from google.api_core.exceptions import PreconditionFailed
+
+    content = bucket.blob(content_path(digest))
+    try:
+        upload_encrypted_file(content, file_path, content_key(digest), if_generation_match=0)
+    except PreconditionFailed:
+        entry = add_reference(bucket, name, digest)
+        if entry is not None:
+            return entry
+
+        # Left behind by an interrupted upload or a delete in progress
+        existing = bucket.get_blob(content_path(digest))
+        upload_encrypted_file(
+            content, file_path, content_key(digest),
+            if_generation_match=existing.generation if existing else 0
+        )
+
+    # The streaming upload does not refresh the blob's properties
+    content.reload()
+
+    for _ in range(MAX_UPDATE_ATTEMPTS):
+        entry, generation = load_refs(bucket, digest)
+        if entry is not None and entry["refs"]:
+            entry["refs"].append(name)
+            entry["reuses"] = entry.get("reuses", 0) + 1
+        else:
+            entry = {
+                **analysis,
+                "refs": [name],
+                "size": content.size,
+                "generation": content.generation,
+            }
+
+        try:
+            save_refs(bucket, digest, entry, generation)
+            return entry
+        except PreconditionFailed:
+            continue
+
+    raise RuntimeError(f"Too many concurrent updates to {refs_path(digest)}")
+
+
+def link(bucket, name, digest, file_path, analysis):
+    """
+    Makes sure the content of `file_path` is stored and referenced by
+    `name`. Returns True when an existing copy was reused.
+    """
+    if add_reference(bucket, name, digest) is not None:
+        with _stats_lock:
+            _stats["bytes_saved"] += os.path.getsize(file_path)
+        return True
+
+    store_content(bucket, name, digest, file_path, analysis)
+    return False
+
+
+def remove_reference(bucket, name, digest):
+    """
+    Removes `name` from the content's references and deletes the content,
+    and its cached OCR results, once nothing refers to it.
+    """
+    from google.api_core.exceptions import NotFound, PreconditionFailed
+
+    for _ in range(MAX_UPDATE_ATTEMPTS):
+        entry, generation = load_refs(bucket, digest)
+        if entry is None:
+            return
+        if name in entry["refs"]:
+            entry["refs"].remove(name)
+
+        try:
+            generation = save_refs(bucket, digest, entry, generation)
+            break
+        except PreconditionFailed:
+            continue
+    else:
+        raise RuntimeError(f"Too many concurrent updates to {refs_path(digest)}")
+
+    if entry["refs"]:
+        return
+
+    # Last reference gone. Both deletes are conditional: an upload that
+    # replaced the content or re-referenced it meanwhile keeps it alive.
+    try:
+        bucket.blob(content_path(digest)).delete(if_generation_match=entry["generation"])
+        bucket.blob(refs_path(digest)).delete(if_generation_match=generation)
+    except (NotFound, PreconditionFailed):
+        return
+
+    if entry.get("ocr_digest"):
+        import ocr_cache
+        ocr_cache.delete(entry["ocr_digest"])
+
+
+# -----------------------------
+# Reporting
+# -----------------------------
+def stats():
+    """
+    Savings made by this process.
+    """
+    with _stats_lock:
+        return {
+            **_stats,
+            "hit_rate": _stats["hits"] / _stats["lookups"] if _stats["lookups"] else 0.0,
+        }
+
+
+def report(bucket):
+    """
+    Savings across the whole store: bytes not stored twice and uploads that
+    skipped OCR and classification.
+    """
+    report = {"contents": 0, "references": 0, "stored_bytes": 0,
+              "bytes_saved": 0, "pipeline_runs_saved": 0}
+
+    for blob in bucket.list_blobs(prefix=CAS_PREFIX):
+        if not blob.name.endswith(".refs"):
+            continue
+
+        digest = blob.name[len(CAS_PREFIX):-len(".refs")]
+        try:
+            entry, _ = load_refs(bucket, digest)
+        except Exception:
+            continue
+        if not entry or not entry["refs"]:
+            continue
+
+        report["contents"] += 1
+        report["references"] += len(entry["refs"])
+        report["stored_bytes"] += entry["size"]
+        report["bytes_saved"] += entry["size"] * (len(entry["refs"]) - 1)
+        report["pipeline_runs_saved"] += entry.get("reuses", 0)
+
+    return report
+
+
+def main():
+    from resources import get_bucket
+    print(json.dumps(report(get_bucket())))
+
+
+if __name__ == "__main__":
+    main()
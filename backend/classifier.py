@@ -1,84 +1,189 @@
-import re
+import os
+import sys
+from resources import get_env, get_resource, resource
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+VECTORIZER_FILE = "tfidf_vectorizer.joblib"
+MODEL_FILE = "doc_classifier.joblib"
+
+# Model predictions below this probability fall back to the rules
+DEFAULT_MIN_CONFIDENCE = 0.6
+
 
 def preprocess(text: str) -> str:
     if not text:
         return ""
-    text = text.lower()
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
+    # Same as collapsing \s+ to one space and stripping, without the regex
+    return " ".join(text.lower().split())
 
 
-def classify_document(text: str) -> str:
-    text = preprocess(text)
+CERTIFICATE_KEYWORDS = (
+    "certificate",
+    "this is to certify",
+    "has successfully completed",
+    "is hereby awarded",
+    "date of issue",
+    "authorized by",
+    "issued on",
+    "seal",
+    "signature"
+)
+
+LEGAL_KEYWORDS = (
+    "agreement",
+    "contract",
+    "party",
+    "parties",
+    "hereby",
+    "whereas",
+    "terms and conditions",
+    "governed by",
+    "liability",
+    "jurisdiction",
+    "witness"
+)
+
+BILL_KEYWORDS = (
+    "invoice",
+    "bill",
+    "total amount",
+    "amount due",
+    "tax",
+    "gst",
+    "subtotal",
+    "payment",
+    "balance",
+    "receipt"
+)
+
+ID_KEYWORDS = (
+    "aadhaar",
+    "passport",
+    "identity",
+    "id number",
+    "date of birth",
+    "dob",
+    "gender",
+    "issued by",
+    "government of",
+    "authority"
+)
+
+# (label, keywords, distinct keywords needed), checked in this order
+RULES = (
+    ("Certificate", CERTIFICATE_KEYWORDS, 2),
+    ("Legal Document", LEGAL_KEYWORDS, 1),
+    ("Bill", BILL_KEYWORDS, 1),
+    ("ID", ID_KEYWORDS, 1),
+)
+
 
+def count_keywords(text: str, keywords, limit: int = None) -> int:
+    """
+    Counts the distinct keywords occurring in `text`, stopping once `limit`
+    are found.
+    """
+    hits = 0
+    for kw in keywords:
+        # Substring search in C beats one combined regex over the text
+        if kw in text:
+            hits += 1
+            if hits == limit:
+                break
+    return hits
+
+
+def classify_preprocessed(text: str) -> str:
     if not text or len(text) < 20:
         return "Miscellaneous"
 
-    certificate_keywords = [
-        "certificate",
-        "this is to certify",
-        "has successfully completed",
-        "is hereby awarded",
-        "date of issue",
-        "authorized by",
-        "issued on",
-        "seal",
-        "signature"
-    ]
+    for label, keywords, needed in RULES:
+        if count_keywords(text, keywords, limit=needed) >= needed:
+            return label
 
-    cert_hits = sum(kw in text for kw in certificate_keywords)
-    if cert_hits >= 2:
-        return "Certificate"
-
-    legal_keywords = [
-        "agreement",
-        "contract",
-        "party",
-        "parties",
-        "hereby",
-        "whereas",
-        "terms and conditions",
-        "governed by",
-        "liability",
-        "jurisdiction",
-        "witness"
-    ]
+    return "Miscellaneous"
+
+
+def classify_by_rules(text: str) -> str:
+    return classify_preprocessed(preprocess(text))
 
-    if any(kw in text for kw in legal_keywords):
-        return "Legal Document"
-    # -----------------------------
-    # 3️⃣ BILLS / INVOICES
-    # -----------------------------
-    bill_keywords = [
-        "invoice",
-        "bill",
-        "total amount",
-        "amount due",
-        "tax",
-        "gst",
-        "subtotal",
-        "payment",
-        "balance",
-        "receipt"
-    ]
 
-    if any(kw in text for kw in bill_keywords):
-        return "Bill"
-
-    id_keywords = [
-        "aadhaar",
-        "passport",
-        "identity",
-        "id number",
-        "date of birth",
-        "dob",
-        "gender",
-        "issued by",
-        "government of",
-        "authority"
+# -----------------------------
+# Model-backed mode
+# -----------------------------
+@resource("classifier_model")
+def _classifier_model():
+    """
+    Loads the artifacts written by train_classifier.py, or returns None when
+    they are missing. Arrays are memory-mapped rather than read into memory,
+    so several processes share one copy through the page cache.
+    """
+    model_dir = get_env("CLASSIFIER_MODEL_DIR", MODEL_DIR)
+    paths = [os.path.join(model_dir, name) for name in (VECTORIZER_FILE, MODEL_FILE)]
+
+    if not all(os.path.exists(path) for path in paths):
+        print(f"Classifier model not found in {model_dir}, using rules", file=sys.stderr)
+        return None
+
+    import joblib
+    vectorizer, model = (joblib.load(path, mmap_mode="r") for path in paths)
+    return vectorizer, model
+
+
+def get_model():
+    """
+    Returns (vectorizer, model) when CLASSIFIER_MODE=model and the artifacts
+    exist, else None. Nothing is imported or loaded until first use.
+    """
+    if get_env("CLASSIFIER_MODE", "rules") != "model":
+        return None
+    return get_resource("classifier_model")
+
+
+def predict_proba(texts):
+    """
+    Returns (classes, probabilities) for a batch of texts, one row per
+    text, vectorized and scored in one call.
+    """
+    loaded = get_resource("classifier_model")
+    if loaded is None:
+        raise FileNotFoundError("Classifier model not found; run train_classifier.py")
+
+    vectorizer, model = loaded
+    return model.classes_, model.predict_proba(vectorizer.transform(texts))
+
+
+def classify_many(texts) -> list:
+    """
+    Labels for many documents, in input order.
+
+    With the model enabled the whole batch is scored at once; documents the
+    model is not confident about get the rule-based label.
+    """
+    texts = list(texts)
+    preprocessed = [preprocess(text) for text in texts]
+
+    if get_model() is None:
+        return [classify_preprocessed(text) for text in preprocessed]
+
+    min_confidence = float(get_env("CLASSIFIER_MIN_CONFIDENCE", DEFAULT_MIN_CONFIDENCE))
+
+    labels = [None] * len(texts)
+    # Too short to say anything about, model or not
+    scored = [i for i, text in enumerate(preprocessed) if len(text) >= 20]
+
+    if scored:
+        classes, probabilities = predict_proba([texts[i] for i in scored])
+        for i, row in zip(scored, probabilities):
+            best = row.argmax()
+            if row[best] >= min_confidence:
+                labels[i] = str(classes[best])
+
+    return [
+        label if label is not None else classify_preprocessed(text)
+        for label, text in zip(labels, preprocessed)
     ]
 
-    if any(kw in text for kw in id_keywords):
-        return "ID"
 
-    return "Miscellaneous"
+def classify_document(text: str) -> str:
+    return classify_many([text])[0]
@@ -0,0 +1,201 @@
+"""
+Segmented, random-access encrypted container (format "sdac1").
+
+Layout:
+
+    header (32 bytes)
+        magic           b"SDAC"
+        version         u8   (1)
+        reserved        3 bytes
+        segment_size    u32  plaintext bytes per segment
+        plaintext_size  u64
+        nonce_prefix    8 bytes, random per object
+        segment_count   u32
+    segment 0 .. segment_count-1
+        AES-GCM(ciphertext || 16 byte tag)
+
+Every segment except the last holds exactly `segment_size` plaintext bytes,
+so segment i starts at HEADER_SIZE + i * (segment_size + TAG_SIZE) and the
+header is the whole index. Segment i uses nonce = nonce_prefix || u32(i) and
+the header as associated data, so segments cannot be reordered, truncated or
+moved between objects without failing authentication.
+
+Objects written this way carry {"format": "sdac1"} in their blob metadata.
+Legacy objects (one AES-CBC stream, IV in metadata) are still readable; see
+storage_utils.document_format and migrate_container.py.
+"""
+import os
+import struct
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+FORMAT = "sdac1"
+MAGIC = b"SDAC"
+VERSION = 1
+
+SEGMENT_SIZE = 1024 * 1024
+TAG_SIZE = 16
+
+_HEADER = struct.Struct(">4sB3xIQ8sI")
+HEADER_SIZE = _HEADER.size
+
+
+class ContainerError(Exception):
+    pass
+
+
+class Header:
+    def __init__(self, segment_size, plaintext_size, nonce_prefix):
+        self.segment_size = segment_size
+        self.plaintext_size = plaintext_size
+        self.nonce_prefix = nonce_prefix
+        self.segment_count = max(1, -(-plaintext_size // segment_size))
+
+    def pack(self):
+        return _HEADER.pack(
+            MAGIC,
+            VERSION,
+            self.segment_size,
+            self.plaintext_size,
+            self.nonce_prefix,
+            self.segment_count
+        )
+
+    @classmethod
+    def unpack(cls, data):
+        if len(data) < HEADER_SIZE:
+            raise ContainerError("Truncated container header")
+
+        magic, version, segment_size, plaintext_size, nonce_prefix, segment_count = \
+            _HEADER.unpack(data[:HEADER_SIZE])
+
+        if magic != MAGIC:
+            raise ContainerError("Not an encrypted container")
+        if version != VERSION:
+            raise ContainerError(f"Unsupported container version: {version}")
+
+        header = cls(segment_size, plaintext_size, nonce_prefix)
+        if header.segment_count != segment_count:
+            raise ContainerError("Corrupt container header")
+
+        return header
+
+    def segment_length(self, index):
+        """
+        Plaintext length of segment `index`.
+        """
+        if index == self.segment_count - 1:
+            return self.plaintext_size - index * self.segment_size
+        return self.segment_size
+
+    def segment_offset(self, index):
+        """
+        Byte offset of segment `index` in the encrypted object.
+        """
+        return HEADER_SIZE + index * (self.segment_size + TAG_SIZE)
+
+
+def _nonce(header, index):
+    return header.nonce_prefix + struct.pack(">I", index)
+
+
+def looks_like_container(data):
+    return data[:len(MAGIC)] == MAGIC
+
+
+class ContainerWriter:
+    """
+    File-like sink that encrypts whatever is written to it into `dst`.
+    The total plaintext size must be known up front because it is part of
+    the authenticated header.
+    """
+
+    def __init__(self, dst, aes_key, plaintext_size, segment_size=SEGMENT_SIZE):
+        self.dst = dst
+        self.aead = AESGCM(aes_key)
+        self.header = Header(segment_size, plaintext_size, os.urandom(8))
+        self.header_bytes = self.header.pack()
+        self._buffer = bytearray()
+        self._index = 0
+        self._written = 0
+
+        self.dst.write(self.header_bytes)
+
+    def _emit(self, data):
+        self.dst.write(self.aead.encrypt(_nonce(self.header, self._index), bytes(data), self.header_bytes))
+        self._index += 1
+
+    def write(self, data):
+        self._written += len(data)
+        if self._written > self.header.plaintext_size:
+            raise ContainerError("More data written than declared plaintext size")
+
+        self._buffer += data
+        segment_size = self.header.segment_size
+        while len(self._buffer) >= segment_size and self._index < self.header.segment_count - 1:
+            self._emit(self._buffer[:segment_size])
+            del self._buffer[:segment_size]
+
+        return len(data)
+
+    def close(self):
+        if self._written != self.header.plaintext_size:
+            raise ContainerError(
+                f"Expected {self.header.plaintext_size} bytes, got {self._written}"
+            )
+        self._emit(self._buffer)
+        self._buffer = bytearray()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+
+def encrypt_to_container(src, dst, aes_key, plaintext_size, segment_size=SEGMENT_SIZE):
+    """
+    Streams `plaintext_size` bytes from `src` into a container written to `dst`.
+    """
+    with ContainerWriter(dst, aes_key, plaintext_size, segment_size) as writer:
+        while True:
+            chunk = src.read(segment_size)
+            if not chunk:
+                break
+            writer.write(chunk)
+
+
+def _read_exact(src, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = src.read(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return bytes(data)
+
+
+def decrypt_container(src, dst, aes_key):
+    """
+    Sequentially decrypts a whole container from `src` into `dst`.
+    """
+    aead = AESGCM(aes_key)
+    header_bytes = _read_exact(src, HEADER_SIZE)
+    header = Header.unpack(header_bytes)
+
+    for index in range(header.segment_count):
+        segment = _read_exact(src, header.segment_length(index) + TAG_SIZE)
+        dst.write(_decrypt_segment(aead, header, header_bytes, index, segment))
+
+
+def _decrypt_segment(aead, header, header_bytes, index, segment):
+    if len(segment) != header.segment_length(index) + TAG_SIZE:
+        raise ContainerError(f"Truncated segment {index}")
+    try:
+        return aead.decrypt(_nonce(header, index), segment, header_bytes)
+    except Exception as e:
+        raise ContainerError(f"Segment {index} failed authentication") from e
+
+
+def is_container_blob(blob):
+    return bool(blob.metadata) and blob.metadata.get("format") == FORMAT
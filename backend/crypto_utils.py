@@ -7,11 +7,8 @@ from cryptography.hazmat.primitives import padding
 from cryptography.hazmat.primitives import serialization
 import json
 import os
-from dotenv import load_dotenv
 from datetime import datetime
-
-load_dotenv()
-MASTER_SECRET = os.getenv("MASTER_SECRET").encode('utf-8')
+from key_manager import get_key_manager
 
 def generate_dh_keys():
     private_key = ec.generate_private_key(ec.SECP384R1())
@@ -53,6 +50,8 @@ def encrypt_file_aes(data, aes_key):
 
     return encrypted_data, iv
 
+STREAM_CHUNK_SIZE = 1024 * 1024
+
 def decrypt_file_aes(encrypted_data, aes_key, iv):
     cipher = Cipher(algorithms.AES(aes_key), modes.CBC(iv))
     decryptor = cipher.decryptor()
@@ -64,6 +63,24 @@ def decrypt_file_aes(encrypted_data, aes_key, iv):
 
     return data
 
+def decrypt_stream_aes(src, dst, aes_key, iv, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Streaming version of decrypt_file_aes, for legacy AES-CBC documents
+    (new uploads use the container format): decrypts `src` chunk by chunk and
+    writes plaintext to `dst` as it goes. The unpadder holds back only the
+    final block, so memory stays at one chunk.
+    """
+    decryptor = Cipher(algorithms.AES(aes_key), modes.CBC(iv)).decryptor()
+    unpadder = padding.PKCS7(128).unpadder()
+
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            break
+        dst.write(unpadder.update(decryptor.update(chunk)))
+
+    dst.write(unpadder.update(decryptor.finalize()) + unpadder.finalize())
+
 def encrypt_metadata_fields(
     filename: str,
     category: str,
@@ -101,12 +118,7 @@ def decrypt_metadata_fields(
     return json.loads(decrypted_json.decode("utf-8"))
 
 def derive_file_key(filename: str) -> bytes:
-    return HKDF(
-        algorithm=hashes.SHA256(),
-        length=32,
-        salt=None,
-        info=filename.encode(),
-    ).derive(MASTER_SECRET)
+    return get_key_manager().derive(filename)
 
 def encrypt_metadata(metadata):
     meta_key = derive_file_key(metadata["user_id"])
@@ -1,10 +1,9 @@
-from google.cloud import firestore
-import os
-from dotenv import load_dotenv
-load_dotenv()
-db = firestore.Client(project=os.getenv("GOOGLE_CLOUD_PROJECT"))
+from resources import get_resource
 
 def save_metadata(filename, category, user_id):
+    from google.cloud import firestore
+
+    db = get_resource("project_firestore")
     db.collection("documents").add({
         "filename": filename,
         "category": category,
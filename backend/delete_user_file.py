@@ -1,11 +1,55 @@
 import sys
 import json
-import os
-from google.cloud import storage
-from dotenv import load_dotenv
+import cas
+from manifest import mark_pending, update_manifest
+from resources import get_bucket
+from summary_store import delete_summary
 
-load_dotenv()
-BUCKET_NAME = os.getenv("BUCKET_NAME")
+class DeletionError(Exception):
+    pass
+
+def delete_file(user_id, filename):
+    bucket = get_bucket()
+
+    # Delete encrypted file
+    file_blob_path = f"documents/{user_id}/{filename}.enc"
+    file_blob = bucket.blob(file_blob_path)
+
+    if not file_blob.exists():
+        raise FileNotFoundError(f"File not found: {filename}")
+    file_blob.reload()
+
+    # Delete metadata file
+    meta_blob_path = f"documents/{user_id}/meta/{filename}.enc"
+    meta_blob = bucket.blob(meta_blob_path)
+
+    # Until the manifest drops the record, listings rebuild it from meta blobs
+    mark_pending(bucket, user_id, filename)
+
+    try:
+        # Delete both files
+        file_blob.delete()
+        meta_blob.delete()
+    except Exception as e:
+        raise DeletionError(f"Deletion failed: {str(e)}") from e
+
+    delete_summary(bucket, user_id, filename)
+
+    # Shared content is deleted with its last reference
+    if cas.is_reference(file_blob):
+        cas.remove_reference(bucket, file_blob_path, file_blob.metadata["cas"])
+
+    update_manifest(
+        bucket,
+        user_id,
+        lambda manifest: manifest["documents"].pop(filename, None),
+        pending=[filename]
+    )
+
+    return {
+        "success": True,
+        "message": f"File '{filename}' deleted successfully"
+    }
 
 def main():
     if len(sys.argv) != 3:
@@ -16,35 +60,11 @@ def main():
     filename = sys.argv[2]
 
     try:
-        # Initialize GCS client
-        client = storage.Client()
-        bucket = client.bucket(BUCKET_NAME)
-
-        # Delete encrypted file
-        file_blob_path = f"documents/{user_id}/{filename}.enc"
-        file_blob = bucket.blob(file_blob_path)
-        
-        if not file_blob.exists():
-            print(json.dumps({"error": f"File not found: {filename}"}))
-            sys.exit(1)
-
-        # Delete metadata file
-        meta_blob_path = f"documents/{user_id}/meta/{filename}.enc"
-        meta_blob = bucket.blob(meta_blob_path)
-
-        try:
-            # Delete both files
-            file_blob.delete()
-            meta_blob.delete()
-
-            print(json.dumps({
-                "success": True,
-                "message": f"File '{filename}' deleted successfully"
-            }))
-
-        except Exception as e:
-            print(json.dumps({"error": f"Deletion failed: {str(e)}"}))
-            sys.exit(1)
+        print(json.dumps(delete_file(user_id, filename)))
+
+    except (FileNotFoundError, DeletionError) as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
 
     except Exception as e:
         print(json.dumps({"error": f"Error: {str(e)}"}))
@@ -1,29 +1,15 @@
 import sys
 import os
-from google.cloud import storage
-from crypto_utils import derive_file_key, decrypt_file_aes
-from dotenv import load_dotenv
+import cas
+from resources import get_bucket
+from storage_utils import download_decrypted_file
 
-load_dotenv()
-BUCKET_NAME = os.getenv("BUCKET_NAME")
+def download_shared_file(user_id, filename, save_path):
+    bucket = get_bucket()
 
-def main():
-    if len(sys.argv) != 4:
-        print("Usage: python download_user_file.py <user_id> <filename> <save_path>")
-        sys.exit(1)
-
-    user_id = sys.argv[1]
-    filename = sys.argv[2]
-    save_path = sys.argv[3]
-
-    client = storage.Client()
-    bucket = client.bucket(BUCKET_NAME)
-
-    # 1️⃣ Download encrypted file
+    # 1️⃣ Locate encrypted file
     file_blob = bucket.blob(f"documents/{user_id}/shared/{filename}.enc")
     file_blob.reload()
-    file_iv = bytes.fromhex(file_blob.metadata["iv"])
-    encrypted_data = file_blob.download_as_bytes()
 
     # 2️⃣ Fetch IV from metadata blob
     meta_blob = bucket.blob(f"documents/{user_id}/meta/shared/{filename}.enc")
@@ -32,20 +18,26 @@ def main():
     if not meta_blob.metadata or "iv" not in meta_blob.metadata:
         raise Exception("IV not found in metadata")
 
-    # 3️⃣ Decrypt
-    key = derive_file_key(filename)
-    decrypted = decrypt_file_aes(
-        encrypted_data,
-        key,
-        file_iv
-    )
+    # A reference resolves to the shared content and its key
+    file_blob, key = cas.resolve(bucket, file_blob, filename)
 
     _, ext = os.path.splitext(filename)
     if not os.path.splitext(save_path)[1]:
         save_path = save_path + ext
-    # 4️⃣ Save file
-    with open(save_path, "wb") as f:
-        f.write(decrypted)
+
+    # 3️⃣ Download, decrypt and save chunk by chunk
+    return download_decrypted_file(file_blob, key, save_path)
+
+def main():
+    if len(sys.argv) != 4:
+        print("Usage: python download_user_file.py <user_id> <filename> <save_path>")
+        sys.exit(1)
+
+    user_id = sys.argv[1]
+    filename = sys.argv[2]
+    save_path = sys.argv[3]
+
+    download_shared_file(user_id, filename, save_path)
 
     print("DOWNLOAD_SUCCESS")
 
@@ -0,0 +1,100 @@
+"""
+Offline stand-in for google.cloud.vision.ImageAnnotatorClient.
+
+Selected with VISION_BACKEND=fake. It answers batch_annotate_images with
+deterministic text derived from each image, so OCR code paths can be
+tested and benchmarked without credentials or network. Latency is
+simulated so batching and client reuse show up in benchmarks:
+
+    FAKE_VISION_CONNECT_MS   cost of creating a client   (default 150)
+    FAKE_VISION_REQUEST_MS   cost of one RPC             (default 80)
+    FAKE_VISION_IMAGE_MS     cost per image in an RPC    (default 20)
+
+Each word of the text gets a box, laid out left to right on one line, in
+both the TEXT_DETECTION and DOCUMENT_TEXT_DETECTION response shapes.
+
+An image whose bytes start with b"FAIL" gets a per-item error.
+"""
+import time
+import hashlib
+from types import SimpleNamespace
+from resources import get_env
+
+
+def _ms(key, default):
+    return float(get_env(key, default)) / 1000
+
+
+def fake_text(content):
+    return f"fake text {hashlib.sha256(content).hexdigest()[:12]}\n"
+
+
+def fake_boxes(text):
+    """
+    Returns [(word, (x0, y0, x1, y1))] for the words of `text`.
+    """
+    boxes = []
+    x = 10
+    for word in text.split():
+        boxes.append((word, (x, 10, x + 12 * len(word), 30)))
+        x += 12 * len(word) + 12
+    return boxes
+
+
+def _vertices(box):
+    x0, y0, x1, y1 = box
+    return [SimpleNamespace(x=x, y=y) for x, y in ((x0, y0), (x1, y0), (x1, y1), (x0, y1))]
+
+
+def _document(text):
+    words = []
+    boxes = fake_boxes(text)
+    for number, (word, box) in enumerate(boxes):
+        # SPACE between words, LINE_BREAK after the last
+        break_type = 5 if number == len(boxes) - 1 else 1
+        symbols = [
+            SimpleNamespace(text=char, property=SimpleNamespace(detected_break=SimpleNamespace(type_=0)))
+            for char in word
+        ]
+        symbols[-1].property.detected_break.type_ = break_type
+        words.append(SimpleNamespace(symbols=symbols, bounding_box=SimpleNamespace(vertices=_vertices(box))))
+
+    paragraph = SimpleNamespace(words=words)
+    page = SimpleNamespace(blocks=[SimpleNamespace(paragraphs=[paragraph])])
+    return SimpleNamespace(text=text, pages=[page])
+
+
+def _response(content):
+    if content.startswith(b"FAIL"):
+        return SimpleNamespace(
+            error=SimpleNamespace(message="fake vision: unreadable image"),
+            full_text_annotation=None,
+            text_annotations=[]
+        )
+
+    text = fake_text(content)
+    return SimpleNamespace(
+        error=SimpleNamespace(message=""),
+        full_text_annotation=_document(text),
+        text_annotations=[SimpleNamespace(description=text)] + [
+            SimpleNamespace(description=word, bounding_poly=SimpleNamespace(vertices=_vertices(box)))
+            for word, box in fake_boxes(text)
+        ]
+    )
+
+
+class FakeVisionClient:
+
+    def __init__(self):
+        self.requests = 0
+        self.images = 0
+        time.sleep(_ms("FAKE_VISION_CONNECT_MS", 150))
+
+    def batch_annotate_images(self, requests):
+        self.requests += 1
+        self.images += len(requests)
+        time.sleep(_ms("FAKE_VISION_REQUEST_MS", 80) + len(requests) * _ms("FAKE_VISION_IMAGE_MS", 20))
+
+        return SimpleNamespace(responses=[
+            _response(request["image"]["content"]) for request in requests
+        ])
@@ -1,15 +1,98 @@
 import sys
 import json
-import os
-import tempfile
-from google.cloud import storage
-from crypto_utils import decrypt_file_aes, derive_file_key
-from summarizer import summarize_text
-from ocr_utils import extract_text_from_bytes, extract_text_from_pdf_gcs
-from dotenv import load_dotenv
+import cas
+from container import ContainerError
+import ocr_cache
+from ocr_utils import extract_text_from_bytes, iter_pdf_text
+from resources import get_bucket
+from storage_utils import document_format, read_decrypted_bytes
+from summary_store import build_page_summary, build_summary, load_summary, save_summary
+
+class SummaryError(Exception):
+    pass
+
+def _response(record):
+    return {
+        "success": True,
+        "summary": record["summary"],
+        "extracted_text": record["preview"]  # First 500 chars for preview
+    }
+
+def get_summary(user_id, filename):
+    bucket = get_bucket()
+
+    # Computed at upload; one small read
+    record = load_summary(bucket, user_id, filename)
+    if record is not None:
+        return _response(record)
+
+    # Download encrypted file from GCS
+    encrypted_blob_path = f"documents/{user_id}/{filename}.enc"
+    blob = bucket.blob(encrypted_blob_path)
+
+    if not blob.exists():
+        raise SummaryError(f"File not found: {filename}")
+
+    # Check the encryption format from blob metadata
+    blob.reload()
+    # Where the upload cached its OCR, for documents stored by reference
+    ocr_digest = cas.ocr_digest(bucket, blob)
+    try:
+        # A reference resolves to the shared content and its key
+        blob, key = cas.resolve(bucket, blob, filename)
+        document_format(blob)
+    except (ContainerError, FileNotFoundError) as e:
+        raise SummaryError(str(e)) from e
+
+    try:
+        # Download and decrypt
+        decrypted_data = read_decrypted_bytes(blob, key)
+
+        # Extract text based on file type
+        filename_lower = filename.lower()
+
+        if filename_lower.endswith((".png", ".jpg", ".jpeg")):
+            def extract():
+                return extract_text_from_bytes(decrypted_data)
+
+        elif filename_lower.endswith(".pdf"):
+            def extract():
+                nonlocal record
+                # Text layer read locally; only scanned pages go to Vision.
+                # Pages are summarized as they are read
+                record, text = build_page_summary(iter_pdf_text(pdf_bytes=decrypted_data))
+                return text
+
+        else:
+            raise SummaryError("Unsupported file type")
+
+        # Same bytes were OCR'd at upload; reuse that result
+        if ocr_digest:
+            extracted_text = ocr_cache.get_or_extract(ocr_digest, extract)
+        else:
+            extracted_text = extract()
+
+        # Generate summary
+        if not extracted_text or len(extracted_text.strip()) == 0:
+            raise SummaryError("Could not extract text from document")
 
-load_dotenv()
-BUCKET_NAME = os.getenv("BUCKET_NAME")
+        # A cached OCR result or an image: summarize the whole text
+        if record is None:
+            record = build_summary(extracted_text)
+
+    except SummaryError:
+        raise
+
+    except Exception as e:
+        raise SummaryError(f"Processing failed: {str(e)}") from e
+
+    try:
+        # Uploaded before summaries were stored, or by another summarizer version
+        save_summary(bucket, user_id, filename, record)
+    except Exception as e:
+        print(f"Summary store failed: {e}", file=sys.stderr)
+
+    return _response(record)
 
 def main():
     if len(sys.argv) != 3:
@@ -20,82 +103,11 @@ def main():
     filename = sys.argv[2]
 
     try:
-        # Initialize GCS client
-        client = storage.Client()
-        bucket = client.bucket(BUCKET_NAME)
-
-        # Download encrypted file from GCS
-        encrypted_blob_path = f"documents/{user_id}/{filename}.enc"
-        blob = bucket.blob(encrypted_blob_path)
-        
-        if not blob.exists():
-            print(json.dumps({"error": f"File not found: {filename}"}))
-            sys.exit(1)
-
-        # Get IV from blob metadata
-        blob.reload()
-        iv_hex = blob.metadata.get("iv") if blob.metadata else None
-        if not iv_hex:
-            print(json.dumps({"error": "IV not found in file metadata"}))
-            sys.exit(1)
-
-        # Download encrypted file
-        encrypted_data = blob.download_as_bytes()
-        file_iv = bytes.fromhex(iv_hex)
-
-        try:
-            # Decrypt file using the filename-based key
-            key = derive_file_key(filename)
-            decrypted_data = decrypt_file_aes(encrypted_data, key, file_iv)
-
-            # Extract text based on file type
-            filename_lower = filename.lower()
-            extracted_text = ""
-
-            if filename_lower.endswith((".png", ".jpg", ".jpeg")):
-                extracted_text = extract_text_from_bytes(decrypted_data)
-            
-            elif filename_lower.endswith(".pdf"):
-                # Save decrypted PDF to temp location
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_pdf:
-                    temp_pdf.write(decrypted_data)
-                    temp_pdf_path = temp_pdf.name
-
-                # Upload to GCS temp location for extraction
-                temp_blob_path = f"temp/{user_id}_{filename}"
-                temp_blob = bucket.blob(temp_blob_path)
-                temp_blob.upload_from_string(decrypted_data, content_type="application/pdf")
-
-                try:
-                    extracted_text = extract_text_from_pdf_gcs(
-                        f"gs://{BUCKET_NAME}/{temp_blob_path}"
-                    )
-                finally:
-                    # Clean up temp blob
-                    temp_blob.delete()
-                    if os.path.exists(temp_pdf_path):
-                        os.unlink(temp_pdf_path)
-            
-            else:
-                print(json.dumps({"error": "Unsupported file type"}))
-                sys.exit(1)
-
-            # Generate summary
-            if not extracted_text or len(extracted_text.strip()) == 0:
-                print(json.dumps({"error": "Could not extract text from document"}))
-                sys.exit(1)
-
-            summary = summarize_text(extracted_text, max_sentences=3)
-
-            print(json.dumps({
-                "success": True,
-                "summary": summary,
-                "extracted_text": extracted_text[:500]  # First 500 chars for preview
-            }))
-
-        except Exception as e:
-            print(json.dumps({"error": f"Processing failed: {str(e)}"}))
-            sys.exit(1)
+        print(json.dumps(get_summary(user_id, filename)))
+
+    except SummaryError as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
 
     except Exception as e:
         print(json.dumps({"error": f"Error: {str(e)}"}))
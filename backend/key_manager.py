@@ -0,0 +1,117 @@
+import time
+import threading
+from collections import OrderedDict
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from resources import get_env, get_resource, resource
+
+DEFAULT_MAX_KEYS = 1024
+DEFAULT_TTL_SECONDS = 300
+
+
+def _zero(key):
+    key[:] = bytes(len(key))
+
+
+class KeyManager:
+    """
+    Derives per-file / per-user AES keys from MASTER_SECRET with HKDF and
+    caches them in a bounded LRU with TTL expiry.
+
+    Cached keys are held in bytearrays that are overwritten with zeros when
+    they are evicted, expire or the cache is cleared. Callers get a bytes
+    copy, which Python cannot wipe, so keep those short-lived.
+    """
+
+    def __init__(self, master_secret, max_keys=DEFAULT_MAX_KEYS,
+                 ttl_seconds=DEFAULT_TTL_SECONDS, clock=time.monotonic):
+        self._master_secret = master_secret
+        self.max_keys = max_keys
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._keys = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _hkdf(self, info):
+        return HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=None,
+            info=info.encode(),
+        ).derive(self._master_secret())
+
+    def _lookup(self, info, now):
+        entry = self._keys.get(info)
+        if entry is None:
+            return None
+
+        key, expires_at = entry
+        if now >= expires_at:
+            del self._keys[info]
+            _zero(key)
+            self.expirations += 1
+            return None
+
+        self._keys.move_to_end(info)
+        return bytes(key)
+
+    def _store(self, info, derived, now):
+        self._keys[info] = (bytearray(derived), now + self.ttl_seconds)
+        self._keys.move_to_end(info)
+
+        while len(self._keys) > self.max_keys:
+            _, (old_key, _) = self._keys.popitem(last=False)
+            _zero(old_key)
+            self.evictions += 1
+
+    def derive(self, info):
+        """
+        Returns the 32-byte key for `info` (a filename or user id).
+        """
+        with self._lock:
+            key = self._lookup(info, self._clock())
+            if key is not None:
+                self.hits += 1
+                return key
+            self.misses += 1
+
+        derived = self._hkdf(info)
+
+        with self._lock:
+            self._store(info, derived, self._clock())
+
+        return derived
+
+    def clear(self):
+        with self._lock:
+            for key, _ in self._keys.values():
+                _zero(key)
+            self._keys.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "cached": len(self._keys),
+            }
+
+
+@resource("key_manager")
+def _key_manager():
+    return KeyManager(
+        lambda: get_resource("master_secret"),
+        max_keys=int(get_env("KEY_CACHE_SIZE", DEFAULT_MAX_KEYS)),
+        ttl_seconds=float(get_env("KEY_CACHE_TTL", DEFAULT_TTL_SECONDS))
+    )
+
+
+def get_key_manager():
+    return get_resource("key_manager")
@@ -1,50 +1,35 @@
-import sys
 import json
-from google.cloud import storage
-from crypto_utils import decrypt_metadata_fields
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
-BUCKET_NAME = os.getenv("BUCKET_NAME")
+import argparse
+from manifest import get_manifest, sorted_records
+from metadata_cache import get_metadata_cache
+from resources import get_bucket
+
+def list_metadata(user_id, workers=None, refresh=False):
+    """
+    Returns the metadata records of `user_id` from the encrypted manifest.
+    A missing or stale manifest (or `refresh`) rebuilds it from the per-file
+    meta blobs, downloading them `workers` at a time.
+    """
+    bucket = get_bucket()
+    manifest = get_manifest(bucket, user_id, refresh=refresh, workers=workers)
+    return sorted_records(manifest["documents"])
+
+def clear_metadata_cache(user_id):
+    get_metadata_cache().clear(user_id)
+    return {"success": True}
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python list_metadata.py <user_id>")
-        sys.exit(1)
-
-    user_id = sys.argv[1]
-
-    client = storage.Client()
-    bucket = client.bucket(BUCKET_NAME)
-
-    prefix = f"documents/{user_id}/meta/"
-    share_prefix = f"documents/{user_id}/meta/share/"
-
-    blobs = bucket.list_blobs(prefix=prefix, delimiter="/")
-
-    results = []
-
-    for blob in blobs:
-        # Skip share folder and any folder placeholder blobs
-        if blob.name.startswith(share_prefix) or blob.name.endswith("/"):
-            continue
-
-        encrypted_metadata = blob.download_as_bytes()
-
-        # Skip blobs without metadata or iv
-        if not blob.metadata or "iv" not in blob.metadata:
-            continue    
-
-        iv_hex = blob.metadata["iv"]
+    parser = argparse.ArgumentParser(usage="python list_metadata.py <user_id> [--workers N] [--refresh] [--clear-cache]")
+    parser.add_argument("user_id")
+    parser.add_argument("--workers", type=int, help="parallel metadata downloads when rebuilding")
+    parser.add_argument("--refresh", action="store_true", help="rebuild the manifest from meta blobs")
+    parser.add_argument("--clear-cache", action="store_true", help="drop this user's local metadata cache")
+    args = parser.parse_args()
 
-        metadata = decrypt_metadata_fields(
-            encrypted_metadata,
-            user_id,
-            bytes.fromhex(iv_hex)
-        )
+    if args.clear_cache:
+        clear_metadata_cache(args.user_id)
 
-        results.append(metadata)
+    results = list_metadata(args.user_id, workers=args.workers, refresh=args.refresh)
 
     # IMPORTANT: print JSON to stdout (Tauri reads this)
     print(json.dumps(results))
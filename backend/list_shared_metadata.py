@@ -1,48 +1,32 @@
 import sys
-import os
 import json
 import traceback
-from pathlib import Path
-from google.cloud import storage
-from dotenv import load_dotenv
+from manifest import get_manifest, sorted_records
+from resources import get_bucket, get_env
 
 def die(msg):
     print(msg, file=sys.stderr)
     sys.exit(1)
 
+def list_shared_metadata(user_id):
+    bucket = get_bucket()
+
+    # NO DECRYPTION of the shared meta blobs:
+    # the manifest only records that a file was shared with this user
+    manifest = get_manifest(bucket, user_id)
+    return sorted_records(manifest["shared"])
+
 def main():
     if len(sys.argv) != 2:
         die("Usage: python list_shared_metadata.py <user_id>")
 
     user_id = sys.argv[1]
 
-    base_dir = Path(__file__).resolve().parent
-    load_dotenv(base_dir / ".env")
-
-    BUCKET_NAME = os.getenv("BUCKET_NAME")
-    if not BUCKET_NAME:
+    if not get_env("BUCKET_NAME"):
         die("BUCKET_NAME not set")
 
     try:
-        client = storage.Client()
-        bucket = client.bucket(BUCKET_NAME)
-
-        prefix = f"documents/{user_id}/meta/shared/"
-        blobs = bucket.list_blobs(prefix=prefix)
-
-        results = []
-
-        for blob in blobs:
-            filename = blob.name.split("/")[-1].replace(".enc", "")
-
-            # NO DECRYPTION
-            # metadata content is ignored intentionally
-            results.append({
-                "filename": filename,
-                "category": "Shared"
-            })
-
-        print(json.dumps(results))
+        print(json.dumps(list_shared_metadata(user_id)))
 
     except Exception:
         traceback.print_exc()
@@ -3,104 +3,145 @@ sys.stdout.reconfigure(line_buffering=True)
 from auth_utils import save_metadata
 import os
 from datetime import datetime
-from google.cloud import storage
-from google.oauth2 import service_account
 from crypto_utils import (
     generate_dh_keys,
-    derive_file_key,
-    encrypt_file_aes,
-    encrypt_metadata_fields,
+    encrypt_metadata,
     serialize_public_key
 )
-from dotenv import load_dotenv
-from ocr_utils import extract_text_from_bytes, extract_text_from_pdf_gcs
+from ocr_utils import extract_text_from_bytes, iter_pdf_text
 from classifier import classify_document
-
-load_dotenv()
-BUCKET_NAME = os.getenv("BUCKET_NAME")
-creds = service_account.Credentials.from_service_account_file(
-     os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
-)
-
-storage_client = storage.Client(
-    credentials=creds,
-    project=creds.project_id
-)
-bucket = storage_client.bucket(BUCKET_NAME)
-
-def main():
-    print("ENTRY: main() started", flush=True)
-    if len(sys.argv) != 3:
-        print("Usage: python app.py <file_path> <user_id>")
-        sys.exit(1)
-
-    file_path = sys.argv[1]
-    user_id = sys.argv[2]
-
-    print("STEP 1: args received", flush=True)
-
-    if not os.path.exists(file_path):
-        print("File does not exist:", file_path)
-        sys.exit(1)
-
-    filename = os.path.basename(file_path)
+import cas
+import ocr_cache
+from manifest import mark_pending, update_manifest
+from resources import get_bucket
+from summary_store import build_page_summary, build_summary, is_current, save_summary
+
+def ocr_file(file_path, filename, ocr_digest):
+    """
+    Extracts the text of a local file, reusing a cached OCR result when the
+    same bytes were OCR'd before. ocr_digest comes from find_duplicate. The
+    word boxes of a fresh OCR are stored alongside it.
+
+    Returns (text, summary). summary is the summary record when the file is
+    a PDF read page by page, summarized as it was read; otherwise None and
+    left to build_summary.
+    """
     filename_lower = filename.lower()
-
-    with open(file_path, "rb") as f:
-        raw_data = f.read()
-
-    print("STEP 2: file read", flush=True)
-    client_private, client_public = generate_dh_keys()
+    # Word boxes of whatever Vision OCRs, kept for redaction
+    words = {}
+    summary = None
 
     if filename_lower.endswith((".png", ".jpg", ".jpeg")):
-        extracted_text = extract_text_from_bytes(raw_data)
+        unit = "px"
 
-    elif filename_lower.endswith(".pdf"):
-        # TEMP upload
-        temp_blob = bucket.blob(f"temp/{filename}")
-        temp_blob.upload_from_string(raw_data, content_type="application/pdf")
+        def extract():
+            with open(file_path, "rb") as f:
+                return extract_text_from_bytes(f.read(), words=words)
 
-        extracted_text = extract_text_from_pdf_gcs(
-            f"gs://{BUCKET_NAME}/temp/{filename}"
-        )
+    elif filename_lower.endswith(".pdf"):
+        unit = "pt"
 
-        # Delete temp immediately
-        temp_blob.delete()
+        def extract():
+            nonlocal summary
+            # Text layer read locally; only scanned pages go to Vision
+            summary, text = build_page_summary(iter_pdf_text(path=file_path, words=words))
+            return text
 
     else:
-        extracted_text = ""
-
-    print("STEP 3: OCR done", flush=True)
-
-    category = classify_document(extracted_text)
+        return "", None
+
+    text = ocr_cache.get_or_extract(ocr_digest, extract)
+
+    if words:
+        ocr_cache.store_words(ocr_digest, unit, words)
+
+    return text, summary
+
+def find_duplicate(file_path, user_id):
+    """
+    Returns (digest, ocr_digest, entry), hashing the file once. entry holds
+    the category and text of an identical earlier upload, or is None when
+    the content is new.
+    """
+    digest, ocr_digest = cas.file_digests(file_path, user_id)
+    return digest, ocr_digest, cas.lookup(get_bucket(), digest)
+
+def store_file(file_path, user_id, category, extracted_text, digest, ocr_digest, summary=None,
+               update_index=True, resume=False):
+    """
+    Encrypts and uploads an analysed file with its metadata and, when given,
+    its summary record. Returns the metadata record. With update_index=False
+    the caller is responsible for adding the record to the user's manifest
+    and clearing its pending marker. With resume=True, a file already
+    stored with the same content (by an interrupted run) is not an error:
+    its metadata is written again.
+    """
+    from google.api_core.exceptions import PreconditionFailed
+
+    bucket = get_bucket()
+    filename = os.path.basename(file_path)
 
-    encrypted_metadata, meta_iv = encrypt_metadata_fields(
-        filename=filename,
-        category=category,
-        user_id=user_id
-    )
+    client_private, client_public = generate_dh_keys()
 
-    aes_key = derive_file_key(filename)
-    encrypted_data, file_iv = encrypt_file_aes(raw_data, aes_key)
+    metadata = {
+        "filename": filename,
+        "category": category,
+        "user_id": user_id,
+        "timestamp": datetime.now().isoformat(),
+    }
+    encrypted_metadata, meta_iv = encrypt_metadata(metadata)
 
     encrypted_filename = f"{filename}.enc"
     client_pub_bytes = serialize_public_key(client_public)
 
-    print("STEP 4: Encryption done", flush=True)
-
     file_blob = bucket.blob(
         f"documents/{user_id}/{encrypted_filename}"
     )
 
-    file_blob.metadata = {
-        "iv": file_iv.hex(),
-        "client_pub": client_pub_bytes.decode()
-    }
+    existing = bucket.get_blob(file_blob.name)
+    if existing is not None and not (resume and (existing.metadata or {}).get("cas") == digest):
+        raise FileExistsError(f"File already exists: {filename}")
 
-    file_blob.upload_from_string(encrypted_data, if_generation_match=0)
-    file_blob.patch()
-    print("STEP 5: Uploading to GCS...", flush=True)
+    if existing is not None:
+        print("STEP 4-5: Same content already uploaded", flush=True)
+    else:
+        print("STEP 4: Encrypting and uploading to GCS...", flush=True)
+
+        # Content is stored once however many times it is uploaded; the
+        # user's object only refers to it
+        cas.link(
+            bucket,
+            file_blob.name,
+            digest,
+            file_path,
+            {
+                "category": category,
+                "text": extracted_text[:1000],
+                "summary": summary,
+                # Lets later reads find the cached OCR, and deletes remove it
+                "ocr_digest": ocr_digest,
+            }
+        )
 
+        file_blob.metadata = {"client_pub": client_pub_bytes.decode(), "cas": digest}
+        try:
+            file_blob.upload_from_string(b"", if_generation_match=0)
+        except PreconditionFailed:
+            # Another upload created the object meanwhile. References are
+            # counted by name, so the one added above is only ours to drop
+            # when that object refers to other content
+            current = bucket.get_blob(file_blob.name)
+            if current is None or (current.metadata or {}).get("cas") != digest:
+                cas.remove_reference(bucket, file_blob.name, digest)
+            raise FileExistsError(f"File already exists: {filename}")
+        except Exception:
+            cas.remove_reference(bucket, file_blob.name, digest)
+            raise
+        print("STEP 5: Encrypted file uploaded", flush=True)
+
+
+    # Until the manifest has the record, listings rebuild it from meta blobs
+    mark_pending(bucket, user_id, filename)
 
     save_metadata(
         filename=filename,
@@ -120,8 +161,73 @@ def main():
     meta_blob.upload_from_string(encrypted_metadata)
     meta_blob.patch()
 
+    if summary:
+        # get_summary serves this instead of re-OCRing the document
+        save_summary(bucket, user_id, filename, summary)
+
+    if update_index:
+        update_manifest(
+            bucket,
+            user_id,
+            lambda manifest: manifest["documents"].__setitem__(filename, metadata),
+            pending=[filename]
+        )
+
     print("STEP 6: Upload complete", flush=True)
 
+    return metadata
+
+def process_file(file_path, user_id):
+    """
+    OCRs, classifies, encrypts and uploads one file for `user_id`.
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"File does not exist: {file_path}")
+
+    filename = os.path.basename(file_path)
+
+    print("STEP 2: Checking for duplicate content...", flush=True)
+
+    digest, ocr_digest, duplicate = find_duplicate(file_path, user_id)
+
+    if duplicate:
+        # Same content was uploaded before: reuse its OCR and category
+        extracted_text = duplicate["text"]
+        category = duplicate["category"]
+        summary = duplicate.get("summary") if is_current(duplicate.get("summary")) else None
+        print("STEP 3: Duplicate content, OCR skipped", flush=True)
+    else:
+        extracted_text, summary = ocr_file(file_path, filename, ocr_digest)
+        print("STEP 3: OCR done", flush=True)
+        category = classify_document(extracted_text)
+        if summary is None:
+            summary = build_summary(extracted_text)
+
+    store_file(file_path, user_id, category, extracted_text, digest, ocr_digest, summary=summary)
+
+    return {
+        "filename": filename,
+        "category": category,
+        "deduplicated": duplicate is not None
+    }
+
+def main():
+    print("ENTRY: main() started", flush=True)
+    if len(sys.argv) != 3:
+        print("Usage: python app.py <file_path> <user_id>")
+        sys.exit(1)
+
+    file_path = sys.argv[1]
+    user_id = sys.argv[2]
+
+    print("STEP 1: args received", flush=True)
+
+    try:
+        process_file(file_path, user_id)
+    except FileNotFoundError:
+        print("File does not exist:", file_path)
+        sys.exit(1)
+
     print("SUCCESS: File and metadata encrypted and uploaded", flush=True)
 
     sys.exit(0)
@@ -0,0 +1,317 @@
+"""
+Per-user encrypted manifest: one object holding every document's metadata
+record, so listing a library is a single GET and decrypt.
+
+    documents/<user_id>/index/manifest.enc
+        {"version": 1,
+         "documents": {filename: metadata record},
+         "shared":    {filename: {"filename": ..., "category": "Shared"}}}
+
+Writers (upload, delete, share) update it with read-modify-write guarded by
+GCS generation preconditions and retry on conflict. The per-file meta blobs
+stay the source of truth: a missing, unreadable or outdated manifest is
+rebuilt from them.
+
+A writer that crashes between changing a meta blob and updating the
+manifest would leave the manifest stale. So writers first drop a marker
+
+    documents/<user_id>/index/pending/<filename>
+
+and remove it once the manifest is updated. Listing checks that prefix
+(usually empty) and rebuilds while markers are present; a rebuild clears
+markers older than PENDING_GRACE_SECONDS, as their writer is gone.
+"""
+import sys
+import json
+import traceback
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from crypto_utils import decrypt_metadata_fields, derive_file_key, encrypt_file_aes, decrypt_file_aes
+from metadata_cache import get_metadata_cache
+from resources import get_env
+
+MANIFEST_VERSION = 1
+MAX_UPDATE_ATTEMPTS = 10
+DEFAULT_WORKERS = 16
+# Markers younger than this may belong to a write still in progress
+PENDING_GRACE_SECONDS = 300
+
+
+def manifest_path(user_id):
+    # Lives in a folder so it can never collide with an uploaded file name
+    return f"documents/{user_id}/index/manifest.enc"
+
+
+def pending_prefix(user_id):
+    return f"documents/{user_id}/index/pending/"
+
+
+def empty_manifest():
+    return {"version": MANIFEST_VERSION, "documents": {}, "shared": {}}
+
+
+def _filename_from_blob(name):
+    # Only the suffix: "a.enc.pdf.enc" belongs to "a.enc.pdf", not "a.pdf"
+    filename = name.rsplit("/", 1)[-1]
+    return filename[:-len(".enc")] if filename.endswith(".enc") else filename
+
+
+# -----------------------------
+# Rebuild from per-file meta blobs
+# -----------------------------
+def _fetch_metadata(blob, user_id):
+    # Skip blobs without metadata or iv
+    if not blob.metadata or "iv" not in blob.metadata:
+        return None
+
+    try:
+        encrypted_metadata = blob.download_as_bytes()
+
+        return decrypt_metadata_fields(
+            encrypted_metadata,
+            user_id,
+            bytes.fromhex(blob.metadata["iv"])
+        )
+
+    except Exception:
+        # One bad blob must not hide the rest of the library
+        print(f"Skipping {blob.name}:", file=sys.stderr)
+        traceback.print_exc()
+        return None
+
+
+def list_meta_blobs(bucket, user_id):
+    prefix = f"documents/{user_id}/meta/"
+    share_prefix = f"documents/{user_id}/meta/share/"
+
+    return [
+        blob for blob in bucket.list_blobs(prefix=prefix, delimiter="/")
+        # Skip share folder and any folder placeholder blobs
+        if not blob.name.startswith(share_prefix) and not blob.name.endswith("/")
+    ]
+
+
+def fetch_metadata_records(blobs, user_id, workers=None):
+    """
+    Downloads and decrypts metadata blobs, `workers` at a time. Returns
+    [(blob, record)] in input order, without the blobs that failed.
+    """
+    if workers is None:
+        workers = int(get_env("LIST_METADATA_WORKERS", DEFAULT_WORKERS))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        records = executor.map(lambda blob: _fetch_metadata(blob, user_id), blobs)
+        return [(blob, record) for blob, record in zip(blobs, records) if record is not None]
+
+
+def scan_manifest(bucket, user_id, workers=None):
+    """
+    Builds a manifest from the per-file meta blobs.
+    """
+    manifest = empty_manifest()
+    cache = get_metadata_cache()
+
+    # Listing returns names and generations; only new or changed
+    # meta blobs are downloaded
+    blobs = list_meta_blobs(bucket, user_id)
+    records = {}
+    missing = []
+    for blob in blobs:
+        record = cache.get(user_id, blob.name, blob.generation)
+        if record is None:
+            missing.append(blob)
+        else:
+            records[blob.name] = record
+
+    for blob, record in fetch_metadata_records(missing, user_id, workers):
+        cache.put(user_id, blob.name, blob.generation, record)
+        records[blob.name] = record
+
+    cache.retain(user_id, f"documents/{user_id}/meta/", [blob.name for blob in blobs])
+
+    for blob in blobs:
+        if blob.name in records:
+            manifest["documents"][_filename_from_blob(blob.name)] = records[blob.name]
+
+    for blob in bucket.list_blobs(prefix=f"documents/{user_id}/meta/shared/"):
+        filename = _filename_from_blob(blob.name)
+        manifest["shared"][filename] = {"filename": filename, "category": "Shared"}
+
+    return manifest
+
+
+# -----------------------------
+# Pending markers
+# -----------------------------
+def mark_pending(bucket, user_id, filename):
+    """
+    Records that `filename`'s meta blob is about to change, before the
+    manifest knows about it.
+    """
+    bucket.blob(f"{pending_prefix(user_id)}{filename}").upload_from_string(b"")
+
+
+def clear_pending(bucket, user_id, filenames):
+    from google.api_core.exceptions import NotFound
+
+    for filename in filenames:
+        try:
+            bucket.blob(f"{pending_prefix(user_id)}{filename}").delete()
+        except NotFound:
+            pass
+        except Exception:
+            # Left behind, it only costs a rebuild
+            traceback.print_exc()
+
+
+def list_pending(bucket, user_id):
+    return list(bucket.list_blobs(prefix=pending_prefix(user_id)))
+
+
+def _clear_abandoned(bucket, markers, scan_started):
+    """
+    Deletes markers old enough that their writer must have finished or
+    died before the rebuild started scanning.
+    """
+    from google.api_core.exceptions import NotFound, PreconditionFailed
+
+    cutoff = scan_started - timedelta(seconds=PENDING_GRACE_SECONDS)
+    for marker in markers:
+        if marker.time_created and marker.time_created < cutoff:
+            try:
+                marker.delete(if_generation_match=marker.generation)
+            except (NotFound, PreconditionFailed):
+                pass
+
+
+# -----------------------------
+# Load / save
+# -----------------------------
+def load_manifest(bucket, user_id):
+    """
+    Returns (manifest, generation). manifest is None when the object is
+    missing, unreadable or from another manifest version; generation is 0
+    when the object does not exist.
+    """
+    blob = bucket.get_blob(manifest_path(user_id))
+    if blob is None:
+        return None, 0
+
+    cache = get_metadata_cache()
+    manifest = cache.get(user_id, blob.name, blob.generation)
+
+    if manifest is None:
+        try:
+            encrypted = blob.download_as_bytes(if_generation_match=blob.generation)
+            manifest = json.loads(decrypt_file_aes(
+                encrypted,
+                derive_file_key(user_id),
+                bytes.fromhex(blob.metadata["iv"])
+            ).decode("utf-8"))
+        except Exception:
+            traceback.print_exc()
+            return None, blob.generation
+
+        cache.put(user_id, blob.name, blob.generation, manifest)
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None, blob.generation
+
+    return manifest, blob.generation
+
+
+def save_manifest(bucket, user_id, manifest, generation):
+    """
+    Writes the manifest only if the stored object is still at `generation`
+    (0 = must not exist). Raises PreconditionFailed otherwise.
+    """
+    encrypted, iv = encrypt_file_aes(
+        json.dumps(manifest).encode("utf-8"),
+        derive_file_key(user_id)
+    )
+
+    blob = bucket.blob(manifest_path(user_id))
+    blob.metadata = {"iv": iv.hex(), "version": str(MANIFEST_VERSION)}
+    blob.upload_from_string(encrypted, if_generation_match=generation)
+
+    # The next load of this generation needs no download
+    get_metadata_cache().put(user_id, blob.name, blob.generation, manifest)
+    return blob.generation
+
+
+def update_manifest(bucket, user_id, mutate, pending=()):
+    """
+    Applies `mutate(manifest)` atomically, retrying on concurrent writes,
+    then clears the `pending` markers the change resolves.
+
+    If the update cannot be made, the manifest is deleted so the next
+    listing rebuilds it from the meta blobs instead of serving stale data.
+    """
+    from google.api_core.exceptions import NotFound, PreconditionFailed
+
+    for _ in range(MAX_UPDATE_ATTEMPTS):
+        manifest, generation = load_manifest(bucket, user_id)
+        if manifest is None:
+            manifest = scan_manifest(bucket, user_id)
+
+        mutate(manifest)
+
+        try:
+            save_manifest(bucket, user_id, manifest, generation)
+        except PreconditionFailed:
+            continue
+        except Exception:
+            traceback.print_exc()
+            break
+
+        clear_pending(bucket, user_id, pending)
+        return manifest
+
+    print(f"WARNING: manifest update failed for {user_id}, invalidating", file=sys.stderr)
+    try:
+        bucket.blob(manifest_path(user_id)).delete()
+    except NotFound:
+        pass
+    return None
+
+
+def get_manifest(bucket, user_id, refresh=False, workers=None):
+    """
+    Returns the user's manifest, rebuilding and storing it when it is
+    missing, stale (pending markers left by an unfinished write) or
+    `refresh` is set.
+    """
+    from google.api_core.exceptions import PreconditionFailed
+
+    markers = list_pending(bucket, user_id)
+
+    if not refresh:
+        manifest, generation = load_manifest(bucket, user_id)
+        if manifest is not None and not markers:
+            return manifest
+    else:
+        generation = None
+
+    scan_started = datetime.now(timezone.utc)
+    manifest = scan_manifest(bucket, user_id, workers)
+
+    if generation is None:
+        blob = bucket.get_blob(manifest_path(user_id))
+        generation = blob.generation if blob else 0
+
+    try:
+        save_manifest(bucket, user_id, manifest, generation)
+        _clear_abandoned(bucket, markers, scan_started)
+    except PreconditionFailed:
+        # Someone else wrote it meanwhile; theirs is at least as fresh
+        pass
+    except Exception:
+        # Listing still works, it just rebuilds again next time
+        traceback.print_exc()
+
+    return manifest
+
+
+def sorted_records(section):
+    # Same order as listing the meta/ prefix
+    return [section[name] for name in sorted(section, key=lambda name: f"{name}.enc")]
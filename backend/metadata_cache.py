@@ -0,0 +1,161 @@
+"""
+Local on-disk cache of decrypted metadata records, keyed by object name and
+GCS generation. A listing only has to download objects whose generation
+changed since the last run.
+
+Records are stored encrypted (AES-CBC with a per-user cache key derived from
+MASTER_SECRET), so the cache file never holds plaintext metadata. Total size
+is capped; least recently used entries are evicted first.
+
+Location:  METADATA_CACHE_PATH  (default ~/.securedocai/metadata_cache.sqlite3)
+Size cap:  METADATA_CACHE_MAX_BYTES (default 64 MiB)
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from crypto_utils import derive_file_key, encrypt_file_aes, decrypt_file_aes
+from resources import get_env, get_resource, resource
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".securedocai", "metadata_cache.sqlite3")
+
+
+def _cache_key(user_id):
+    return derive_file_key(f"metadata-cache:{user_id}")
+
+
+class MetadataCache:
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                user_id     TEXT NOT NULL,
+                name        TEXT NOT NULL,
+                generation  INTEGER NOT NULL,
+                iv          BLOB NOT NULL,
+                data        BLOB NOT NULL,
+                size        INTEGER NOT NULL,
+                last_used   REAL NOT NULL,
+                PRIMARY KEY (user_id, name)
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_used)")
+        self._db.commit()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id, name, generation):
+        """
+        Returns the cached record for `name` at `generation`, or None.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT iv, data FROM entries WHERE user_id = ? AND name = ? AND generation = ?",
+                (user_id, name, generation)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._db.execute(
+                "UPDATE entries SET last_used = ? WHERE user_id = ? AND name = ?",
+                (time.time(), user_id, name)
+            )
+            self._db.commit()
+
+        iv, data = row
+        try:
+            return json.loads(decrypt_file_aes(data, _cache_key(user_id), iv).decode("utf-8"))
+        except Exception:
+            # Unreadable (e.g. MASTER_SECRET rotated): treat as a miss
+            self.delete(user_id, name)
+            return None
+
+    def put(self, user_id, name, generation, record):
+        data, iv = encrypt_file_aes(json.dumps(record).encode("utf-8"), _cache_key(user_id))
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (user_id, name, generation, iv, data, len(data), time.time())
+            )
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self._db.execute(
+            "SELECT user_id, name, size FROM entries ORDER BY last_used"
+        ).fetchall()
+        for user_id, name, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM entries WHERE user_id = ? AND name = ?", (user_id, name))
+            total -= size
+
+    def delete(self, user_id, name):
+        with self._lock:
+            self._db.execute("DELETE FROM entries WHERE user_id = ? AND name = ?", (user_id, name))
+            self._db.commit()
+
+    def retain(self, user_id, prefix, names):
+        """
+        Drops cached entries under `prefix` whose objects no longer exist.
+        """
+        names = set(names)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name FROM entries WHERE user_id = ? AND substr(name, 1, ?) = ?",
+                (user_id, len(prefix), prefix)
+            ).fetchall()
+            for (name,) in rows:
+                if name not in names:
+                    self._db.execute("DELETE FROM entries WHERE user_id = ? AND name = ?", (user_id, name))
+            self._db.commit()
+
+    def clear(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._db.execute("DELETE FROM entries")
+            else:
+                self._db.execute("DELETE FROM entries WHERE user_id = ?", (user_id,))
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            count, total = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": count,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+        }
+
+
+@resource("metadata_cache")
+def _metadata_cache():
+    return MetadataCache(
+        get_env("METADATA_CACHE_PATH", DEFAULT_PATH),
+        max_bytes=int(get_env("METADATA_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+    )
+
+
+def get_metadata_cache():
+    return get_resource("metadata_cache")
@@ -0,0 +1,104 @@
+"""
+Rewrites a user's legacy AES-CBC documents as segmented containers.
+
+Usage: python migrate_container.py <user_id> [--dry-run]
+
+Each object is streamed: downloaded in ranges, decrypted, re-encrypted into
+the container format and uploaded with a generation precondition, so nothing
+is held in memory or written to local disk, and an object that changes while
+it is being migrated is left alone.
+"""
+import sys
+import json
+import argparse
+import cas
+from crypto_utils import derive_file_key, decrypt_file_aes, decrypt_stream_aes
+from container import FORMAT, ContainerWriter
+from resources import get_bucket
+from storage_utils import DOWNLOAD_CHUNK_SIZE, UPLOAD_CHUNK_SIZE, LEGACY_FORMAT, document_format
+
+
+def legacy_plaintext_size(blob, aes_key, iv):
+    """
+    Plaintext size of a legacy object, found by decrypting only its last
+    block to read the PKCS7 padding length.
+    """
+    if blob.size < 16 or blob.size % 16:
+        raise ValueError(f"Not an AES-CBC object: {blob.name}")
+
+    if blob.size == 16:
+        tail = iv + blob.download_as_bytes()
+    else:
+        tail = blob.download_as_bytes(start=blob.size - 32, end=blob.size - 1)
+
+    last_block = decrypt_file_aes(tail[16:], aes_key, tail[:16])
+    return blob.size - 16 + len(last_block)
+
+
+def migrate_blob(bucket, blob):
+    filename = blob.name.rsplit("/", 1)[-1][:-len(".enc")]
+    key = derive_file_key(filename)
+    iv = bytes.fromhex(blob.metadata["iv"])
+
+    plaintext_size = legacy_plaintext_size(blob, key, iv)
+
+    target = bucket.blob(blob.name)
+    target.content_type = blob.content_type
+    target.metadata = {
+        **{k: v for k, v in blob.metadata.items() if k != "iv"},
+        "format": FORMAT
+    }
+
+    with blob.open("rb", chunk_size=DOWNLOAD_CHUNK_SIZE) as src, \
+            target.open("wb", chunk_size=UPLOAD_CHUNK_SIZE, ignore_flush=True,
+                        if_generation_match=blob.generation) as dst:
+        with ContainerWriter(dst, key, plaintext_size) as writer:
+            decrypt_stream_aes(src, writer, key, iv, chunk_size=DOWNLOAD_CHUNK_SIZE)
+
+    return plaintext_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate legacy encrypted documents to the container format")
+    parser.add_argument("user_id")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    bucket = get_bucket()
+    prefix = f"documents/{args.user_id}/"
+
+    migrated = skipped = failed = 0
+
+    for blob in bucket.list_blobs(prefix=prefix):
+        name = blob.name
+        folder = name[len(prefix):].rpartition("/")[0]
+
+        # Only documents: own files and shared copies, not meta/ or index/
+        if not name.endswith(".enc") or folder not in ("", "shared"):
+            continue
+
+        try:
+            # References point at content that is written as a container
+            if cas.is_reference(blob) or document_format(blob) != LEGACY_FORMAT:
+                skipped += 1
+                continue
+
+            if args.dry_run:
+                print(json.dumps({"object": name, "status": "would_migrate"}))
+                migrated += 1
+                continue
+
+            size = migrate_blob(bucket, blob)
+            print(json.dumps({"object": name, "status": "migrated", "bytes": size}))
+            migrated += 1
+
+        except Exception as e:
+            print(json.dumps({"object": name, "status": "failed", "error": str(e)}))
+            failed += 1
+
+    print(json.dumps({"migrated": migrated, "skipped": skipped, "failed": failed}))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
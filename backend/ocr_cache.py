@@ -0,0 +1,167 @@
+"""
+OCR result cache keyed by the content of the document.
+
+Vision OCR is paid and takes seconds, and the same bytes get OCR'd at upload,
+on every summary request and again when a file is re-uploaded. Results are
+stored in GCS as
+
+    ocr-cache/<digest>.enc
+
+where digest is an HMAC-SHA256 of the plaintext under a key derived from
+MASTER_SECRET, per user unless CAS_SCOPE=global, like the CAS digest. A
+plain SHA-256 would let anyone with bucket access confirm whether a known
+document was uploaded; the keyed hash does not. The text is encrypted
+under a key derived from MASTER_SECRET and the digest.
+
+The word boxes Vision returned for the same OCR run are kept next to it, as
+
+    ocr-cache/<digest>.words.enc
+
+so scanned pages and images can be redacted later without OCRing them
+again.
+
+The digest is recorded in the document's CAS entry (cas.py), which is how
+later reads find it, and both objects are deleted with the content when
+its last reference goes away.
+"""
+import sys
+import json
+import time
+import threading
+from crypto_utils import derive_file_key, encrypt_file_aes, decrypt_file_aes
+from resources import get_bucket
+
+CACHE_PREFIX = "ocr-cache/"
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "saved_seconds": 0.0, "ocr_seconds": 0.0}
+
+
+def _blob(digest):
+    return get_bucket().blob(f"{CACHE_PREFIX}{digest}.enc")
+
+
+def lookup(digest):
+    """
+    Returns (result, ocr_seconds) for a cached digest, or None.
+    """
+    blob = get_bucket().get_blob(f"{CACHE_PREFIX}{digest}.enc")
+    if blob is None or not blob.metadata or "iv" not in blob.metadata:
+        return None
+
+    try:
+        decrypted = decrypt_file_aes(
+            blob.download_as_bytes(),
+            derive_file_key(f"ocr-cache:{digest}"),
+            bytes.fromhex(blob.metadata["iv"])
+        )
+        return json.loads(decrypted.decode("utf-8")), float(blob.metadata.get("ocr_seconds", 0))
+    except Exception:
+        return None
+
+
+def lookup_words(digest):
+    """
+    Returns the word boxes stored for a digest, or None: {"unit": "pt" for
+    PDF pages or "px" for images, "pages": {page number: words}}.
+    """
+    blob = get_bucket().get_blob(f"{CACHE_PREFIX}{digest}.words.enc")
+    if blob is None or not blob.metadata or "iv" not in blob.metadata:
+        return None
+
+    try:
+        decrypted = decrypt_file_aes(
+            blob.download_as_bytes(),
+            derive_file_key(f"ocr-words:{digest}"),
+            bytes.fromhex(blob.metadata["iv"])
+        )
+        words = json.loads(decrypted.decode("utf-8"))
+    except Exception:
+        return None
+
+    # JSON object keys are strings
+    words["pages"] = {int(number): page for number, page in words["pages"].items()}
+    return words
+
+
+def store_words(digest, unit, pages):
+    """
+    Stores word boxes by page number. Best effort: a failure is logged, not
+    raised, since the upload itself succeeded.
+    """
+    try:
+        encrypted, iv = encrypt_file_aes(
+            json.dumps({"unit": unit, "pages": pages}).encode("utf-8"),
+            derive_file_key(f"ocr-words:{digest}")
+        )
+
+        blob = get_bucket().blob(f"{CACHE_PREFIX}{digest}.words.enc")
+        blob.metadata = {"iv": iv.hex()}
+        blob.upload_from_string(encrypted)
+    except Exception as e:
+        print(f"OCR word boxes store failed: {e}", file=sys.stderr)
+
+
+def store(digest, result, ocr_seconds):
+    encrypted, iv = encrypt_file_aes(
+        json.dumps(result).encode("utf-8"),
+        derive_file_key(f"ocr-cache:{digest}")
+    )
+
+    blob = _blob(digest)
+    blob.metadata = {"iv": iv.hex(), "ocr_seconds": f"{ocr_seconds:.3f}"}
+    blob.upload_from_string(encrypted)
+
+
+def delete(digest):
+    """
+    Deletes the text and word boxes cached for a digest.
+    """
+    from google.api_core.exceptions import NotFound
+
+    for name in (f"{CACHE_PREFIX}{digest}.enc", f"{CACHE_PREFIX}{digest}.words.enc"):
+        try:
+            get_bucket().blob(name).delete()
+        except NotFound:
+            pass
+
+
+def get_or_extract(digest, extract):
+    """
+    Returns the cached OCR result for `digest`, or calls `extract()`,
+    caches what it returns and returns it. `extract` must return
+    something JSON-serialisable (the extracted text).
+    """
+    cached = lookup(digest)
+    if cached is not None:
+        result, ocr_seconds = cached
+        with _stats_lock:
+            _stats["hits"] += 1
+            _stats["saved_seconds"] += ocr_seconds
+        print(f"OCR cache hit (saved {ocr_seconds:.1f}s)", file=sys.stderr)
+        return result
+
+    start = time.perf_counter()
+    result = extract()
+    elapsed = time.perf_counter() - start
+
+    with _stats_lock:
+        _stats["misses"] += 1
+        _stats["ocr_seconds"] += elapsed
+
+    try:
+        store(digest, result, elapsed)
+    except Exception as e:
+        # A failed cache write must not fail the upload
+        print(f"OCR cache store failed: {e}", file=sys.stderr)
+
+    return result
+
+
+def stats():
+    with _stats_lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "hit_rate": _stats["hits"] / lookups if lookups else 0.0,
+        }
@@ -1,40 +1,290 @@
-from google.cloud import vision
+import sys
+import time
+from resources import get_env, get_resource, resource
 
-def extract_text_from_bytes(file_bytes):
-    client = vision.ImageAnnotatorClient()
+# Pages whose text layer has fewer characters than this are treated as
+# scanned and sent to Vision
+MIN_PAGE_TEXT_CHARS = 16
+OCR_RENDER_DPI = 200
 
-    image = vision.Image(content=file_bytes)
-    response = client.text_detection(image=image)
+# Vision limits: 16 images per batch_annotate_images request, and the
+# whole request must stay under the API's payload cap
+VISION_BATCH_SIZE = 16
+VISION_BATCH_BYTES = 8 * 1024 * 1024
 
-    if response.error.message:
-        raise Exception(response.error.message)
+# Whitespace after a word, by Vision's DetectedBreak.BreakType
+WORD_BREAKS = {1: " ", 2: " ", 3: "\n", 4: "\n", 5: "\n"}
+
+# Large PDFs are processed as page ranges, several at a time
+DEFAULT_PDF_SHARD_PAGES = 16
+DEFAULT_PDF_WORKERS = 4
+
+
+@resource("vision_client")
+def _vision_client():
+    # One client (one gRPC channel and auth handshake) per process
+    if get_env("VISION_BACKEND", "google") == "fake":
+        from fake_vision import FakeVisionClient
+        return FakeVisionClient()
+
+    from google.cloud import vision
+    return vision.ImageAnnotatorClient()
+
+
+def get_vision_client():
+    return get_resource("vision_client")
+
+
+def _batches(images):
+    """
+    Groups image indexes into batches within the count and size limits.
+    An image larger than the size limit goes alone in its own batch.
+    """
+    batch, size = [], 0
+    for index, image in enumerate(images):
+        if batch and (len(batch) == VISION_BATCH_SIZE or size + len(image) > VISION_BATCH_BYTES):
+            yield batch
+            batch, size = [], 0
+        batch.append(index)
+        size += len(image)
+
+    if batch:
+        yield batch
+
+
+def _response_text(response, feature):
+    if feature == "DOCUMENT_TEXT_DETECTION":
+        return response.full_text_annotation.text if response.full_text_annotation else ""
 
     texts = response.text_annotations
-    if not texts:   
-        return ""
+    return texts[0].description if texts else ""
 
-    return texts[0].description
 
-def extract_text_from_pdf_gcs(gcs_uri):
-    client = vision.ImageAnnotatorClient()
+def _box(vertices):
+    xs = [vertex.x for vertex in vertices]
+    ys = [vertex.y for vertex in vertices]
+    return [min(xs), min(ys), max(xs), max(ys)]
 
-    feature = vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
-    gcs_source = vision.GcsSource(uri=gcs_uri)
-    input_config = vision.InputConfig(
-        gcs_source=gcs_source,
-        mime_type="application/pdf"
-    )
 
-    request = vision.AnnotateFileRequest(
-        features=[feature],
-        input_config=input_config
-    )
+def _response_words(response, feature):
+    """
+    Returns the recognised words as [text, x0, y0, x1, y1, break] in image
+    pixels, in reading order; break is the whitespace that follows the word.
+    """
+    if feature != "DOCUMENT_TEXT_DETECTION":
+        # The first annotation is the whole text, the rest are its words
+        return [
+            [annotation.description, *_box(annotation.bounding_poly.vertices), " "]
+            for annotation in response.text_annotations[1:]
+        ]
+
+    words = []
+    annotation = response.full_text_annotation
+    for page in (annotation.pages if annotation else ()):
+        for block in page.blocks:
+            for paragraph in block.paragraphs:
+                for word in paragraph.words:
+                    if not word.symbols:
+                        continue
+                    break_type = int(word.symbols[-1].property.detected_break.type_)
+                    words.append([
+                        "".join(symbol.text for symbol in word.symbols),
+                        *_box(word.bounding_box.vertices),
+                        WORD_BREAKS.get(break_type, "")
+                    ])
+    return words
+
+
+def annotate_images(images, feature="DOCUMENT_TEXT_DETECTION"):
+    """
+    OCRs a list of image bytes in as few Vision requests as the limits allow.
+
+    Returns one {"text": str, "words": list, "error": str | None} per
+    image, in input order; words are as returned by _response_words. A
+    failed image or a failed request only marks the images it covers; the
+    rest still come back.
+    """
+    client = get_vision_client()
+    results = [None] * len(images)
+
+    for batch in _batches(images):
+        requests = [
+            {"image": {"content": images[index]}, "features": [{"type_": feature}]}
+            for index in batch
+        ]
+
+        try:
+            responses = client.batch_annotate_images(requests=requests).responses
+        except Exception as e:
+            for index in batch:
+                results[index] = {"text": "", "words": [], "error": str(e)}
+            continue
+
+        for index, response in zip(batch, responses):
+            if response.error.message:
+                results[index] = {"text": "", "words": [], "error": response.error.message}
+            else:
+                results[index] = {
+                    "text": _response_text(response, feature),
+                    "words": _response_words(response, feature),
+                    "error": None
+                }
+
+    return results
+
+
+def extract_text_from_bytes(file_bytes, words=None):
+    """
+    OCRs an image. If `words` is a dict, words[0] is set to the image's
+    word boxes, in pixels.
+    """
+    result = annotate_images([file_bytes], feature="TEXT_DETECTION")[0]
+
+    if result["error"]:
+        raise Exception(result["error"])
+
+    if words is not None:
+        words[0] = result["words"]
+
+    return result["text"]
+
 
-    response = client.batch_annotate_files(requests=[request])
+def _pdf_shards(page_count, shard_pages):
+    return [(first, min(first + shard_pages, page_count)) for first in range(0, page_count, shard_pages)]
+
+
+def _pdf_workers(workers):
+    if workers is None:
+        workers = int(get_env("OCR_PDF_WORKERS", DEFAULT_PDF_WORKERS))
+    return max(1, workers)
+
+
+def _open_pdf(pdf_bytes, path):
+    import fitz  # PyMuPDF
+
+    if path is not None:
+        return fitz.open(path)
+    return fitz.open(stream=pdf_bytes, filetype="pdf")
+
+
+def _read_shard(doc, first, last):
+    """
+    Reads pages [first, last) of an open document. Returns (texts, scanned,
+    images): the text layer of each page, and the index in the shard and
+    rendering of each page that needs OCR.
+    """
+    texts = []
+    scanned = []
+    images = []
+    for number in range(first, last):
+        page = doc[number]
+        text = page.get_text("text")
+        texts.append(text)
+
+        if len(text.strip()) < MIN_PAGE_TEXT_CHARS:
+            scanned.append(number - first)
+            images.append(page.get_pixmap(dpi=OCR_RENDER_DPI).tobytes("png"))
+
+    return texts, scanned, images
+
+
+def _ocr_shard(first, texts, scanned, images):
+    """
+    OCRs the rendered pages of a shard; no MuPDF calls, so it can run on
+    any thread. Returns (texts, ocr_pages, ocr_seconds, words), words
+    mapping the number of each OCR'd page to its word boxes in PDF points.
+    """
+    ocr_seconds = 0.0
+    words = {}
+    if images:
+        ocr_start = time.perf_counter()
+        # Rendered pixels back to the page's (visible) coordinates
+        scale = 72 / OCR_RENDER_DPI
+        for index, result in zip(scanned, annotate_images(images)):
+            if result["error"]:
+                raise Exception(f"OCR failed on page {first + index + 1}: {result['error']}")
+            texts[index] = result["text"]
+            words[first + index] = [
+                [text, *(round(value * scale, 2) for value in box), sep]
+                for text, *box, sep in result["words"]
+            ]
+        ocr_seconds = time.perf_counter() - ocr_start
+
+    return texts, len(scanned), ocr_seconds, words
+
+
+def iter_pdf_pages(pdf_bytes=None, path=None, workers=None, shard_pages=None, stats=None, words=None):
+    """
+    Yields the text of each page of a PDF, in page order, as soon as the
+    pages before it are done.
+
+    The document is read in ranges of `shard_pages` pages on the calling
+    thread (PyMuPDF does not support multithreaded use), and the Vision
+    requests for the scanned pages of up to `workers` ranges run
+    concurrently. If `stats` is a dict it is filled in as ranges finish,
+    and if `words` is a dict it gets the word boxes of every OCR'd page by
+    page number.
+    """
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor
+
+    if shard_pages is None:
+        shard_pages = int(get_env("OCR_PDF_SHARD_PAGES", DEFAULT_PDF_SHARD_PAGES))
+    workers = _pdf_workers(workers)
+
+    doc = _open_pdf(pdf_bytes, path)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        page_count = doc.page_count
+        if stats is not None:
+            stats.update({"pages": page_count, "text_layer_pages": 0, "ocr_pages": 0, "ocr_seconds": 0.0})
+
+        def finish(future):
+            texts, ocr_pages, ocr_seconds, page_words = future.result()
+
+            if stats is not None:
+                stats["text_layer_pages"] += len(texts) - ocr_pages
+                stats["ocr_pages"] += ocr_pages
+                stats["ocr_seconds"] += ocr_seconds
+            if words is not None:
+                words.update(page_words)
+            return texts
+
+        pending = deque()
+        for first, last in _pdf_shards(page_count, max(1, shard_pages)):
+            pending.append(executor.submit(_ocr_shard, first, *_read_shard(doc, first, last)))
+
+            # Rendered pages wait for at most `workers` ranges of OCR
+            while len(pending) > workers or (pending and pending[0].done()):
+                yield from finish(pending.popleft())
+
+        while pending:
+            yield from finish(pending.popleft())
+    finally:
+        # Stop queued OCR if the caller stops early or a range failed
+        executor.shutdown(wait=True, cancel_futures=True)
+        doc.close()
+
+
+def iter_pdf_text(pdf_bytes=None, path=None, words=None):
+    """
+    Yields the page texts of a PDF like iter_pdf_pages, for callers that
+    consume pages as they arrive, and logs the page counts at the end.
+    """
+    start = time.perf_counter()
+
+    stats = {}
+    yield from iter_pdf_pages(pdf_bytes=pdf_bytes, path=path, stats=stats, words=words)
+
+    print(
+        f"PDF text: {stats['pages']} pages, {stats['ocr_pages']} needed OCR "
+        f"({stats['ocr_seconds']:.1f}s OCR, {time.perf_counter() - start:.1f}s total)",
+        file=sys.stderr
+    )
 
-    text = ""
-    for page in response.responses[0].responses:
-        if page.full_text_annotation:
-            text += page.full_text_annotation.text
 
-    return text
\ No newline at end of file
+def extract_text_from_pdf(pdf_bytes=None, path=None, words=None):
+    """
+    Extracts the text of a PDF locally, using Vision only for scanned pages.
+    """
+    return "".join(iter_pdf_text(pdf_bytes=pdf_bytes, path=path, words=words))
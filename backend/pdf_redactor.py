@@ -1,33 +1,346 @@
+import os
+import math
+import bisect
+import multiprocessing
 import fitz  # PyMuPDF
-import re
-from pii_pattern import PII_PATTERNS
+from pii_pattern import find_pii
+from resources import get_env
+
+# Character boxes only; image data is not needed to locate text
+TEXT_FLAGS = fitz.TEXTFLAGS_RAWDICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+# Documents shorter than this are redacted in-process: starting workers
+# costs more than it saves
+PARALLEL_MIN_PAGES = 64
+MIN_SHARD_PAGES = 16
+# Shards per worker, so a worker that gets dense pages does not hold up
+# the others
+SHARDS_PER_WORKER = 4
+# Catalog entries that merging shards cannot rebuild (named destinations,
+# embedded files and scripts live under Names); such documents are
+# redacted serially
+UNSHARDABLE_KEYS = ("Names", "Dests", "AcroForm")
+
+
+def page_chars(page):
+    """
+    Returns (text, boxes) for a page. text is the page text with a newline
+    after every line, and boxes[i] is (line number, bbox) of text[i], or
+    None for the added newlines.
+    """
+    chars = []
+    boxes = []
+    line_no = 0
+
+    for block in page.get_text("rawdict", flags=TEXT_FLAGS)["blocks"]:
+        for line in block.get("lines", ()):
+            for span in line["spans"]:
+                for char in span["chars"]:
+                    chars.append(char["c"])
+                    boxes.append((line_no, char["bbox"]))
+
+            chars.append("\n")
+            boxes.append(None)
+            line_no += 1
+
+    return "".join(chars), boxes
+
+
+def span_rects(boxes, start, end):
+    """
+    Returns one rectangle per text line covered by text[start:end].
+    """
+    rects = {}
+
+    for box in boxes[start:end]:
+        if box is None:
+            continue
+
+        line_no, (x0, y0, x1, y1) = box
+        rect = rects.get(line_no)
+        if rect is None:
+            rects[line_no] = [x0, y0, x1, y1]
+        else:
+            rect[0] = min(rect[0], x0)
+            rect[1] = min(rect[1], y0)
+            rect[2] = max(rect[2], x1)
+            rect[3] = max(rect[3], y1)
+
+    return [fitz.Rect(rect) for rect in rects.values()]
+
+
+def pii_word_boxes(words):
+    """
+    Returns (boxes, matches) for OCR words as stored by ocr_utils
+    ([text, x0, y0, x1, y1, break]): the boxes of every word that is part
+    of a PII match, and the number of matches.
+    """
+    parts = []
+    starts = []
+    offset = 0
+    for text, *_, sep in words:
+        starts.append(offset)
+        parts += (text, sep)
+        offset += len(text) + len(sep)
+
+    boxes = []
+    matches = 0
+    for _, start, end in find_pii("".join(parts)):
+        # Whole words are covered, also when the match is part of a word
+        first = max(bisect.bisect_right(starts, start) - 1, 0)
+        last = bisect.bisect_left(starts, end)
+        boxes += [words[index][1:5] for index in range(first, last)]
+        matches += 1
+
+    return boxes, matches
+
+
+def redact_page(page, ocr_words=None, areas=None):
+    """
+    Redacts the PII in a page's text layer and, given the OCR word boxes
+    of a scanned page (in points), in its image. Returns the number of
+    matches. If `areas` is a list, the redacted rectangles are appended to
+    it, in the coordinates of page.get_links().
+    """
+    text, boxes = page_chars(page)
+
+    matches = 0
+    for _, start, end in find_pii(text):
+        # Only the matched characters are covered, not other occurrences
+        # of the same string elsewhere on the page
+        for rect in span_rects(boxes, start, end):
+            page.add_redact_annot(rect, fill=(0, 0, 0))
+        matches += 1
+
+    if ocr_words:
+        word_boxes, word_matches = pii_word_boxes(ocr_words)
+        for box in word_boxes:
+            # Boxes come from the rendered (rotated) page
+            page.add_redact_annot(fitz.Rect(box) * page.derotation_matrix, fill=(0, 0, 0))
+        matches += word_matches
+
+    if matches:
+        if areas is not None:
+            areas += [
+                annot.rect * page.rotation_matrix
+                for annot in page.annots(types=(fitz.PDF_ANNOT_REDACT,))
+            ]
+        # Image pixels under the boxes are blacked out too, and links
+        # over them removed
+        page.apply_redactions()
+
+    return matches
+
+
+def redact_workers(workers=None):
+    if workers is None:
+        workers = int(get_env("PDF_REDACT_WORKERS", min(4, os.cpu_count() or 1)))
+    return max(1, workers)
+
+
+def _open_source(source):
+    """
+    Opens a PDF given as a path or as bytes.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+# The document a worker process redacts shards of; set once per worker so
+# in-memory documents are not sent again with every shard
+_worker_source = None
+
+
+def _init_worker(source):
+    global _worker_source
+    _worker_source = source
+
+
+def _redact_shard(first, last, ocr_words):
+    """
+    Redacts pages first..last (inclusive) in a worker process. Returns the
+    redacted pages as PDF bytes, the number of matches and the links to
+    pages outside the shard, as (page number, link) pairs.
+    """
+    src = _open_source(_worker_source)
+    shard = fitz.open()
+    try:
+        shard.insert_pdf(src, from_page=first, to_page=last)
+
+        matches = 0
+        links = []
+        for number, page in enumerate(shard, first):
+            areas = []
+            matches += redact_page(page, ocr_words.get(number), areas)
+
+            # insert_pdf drops these; the ones redaction would have
+            # removed (any over a redacted area) stay dropped
+            links += [
+                (number, link) for link in src[number].get_links()
+                if link["kind"] == fitz.LINK_GOTO
+                and not first <= link["page"] <= last
+                and 0 <= link["page"] < src.page_count
+                and not any(link["from"].intersects(area) for area in areas)
+            ]
+
+        return shard.tobytes(), matches, links
+    finally:
+        shard.close()
+        src.close()
+
+
+def _shards(page_count, workers):
+    shard_pages = max(MIN_SHARD_PAGES, -(-page_count // (workers * SHARDS_PER_WORKER)))
+    return [
+        (first, min(first + shard_pages, page_count) - 1)
+        for first in range(0, page_count, shard_pages)
+    ]
+
+
+def _shardable(doc):
+    catalog = doc.pdf_catalog()
+    return all(doc.xref_get_key(catalog, key)[0] == "null" for key in UNSHARDABLE_KEYS)
+
+
+def _redact_parallel(source, page_count, workers, ocr_words):
+    from concurrent.futures import ProcessPoolExecutor
+
+    shards = _shards(page_count, workers)
+
+    # Workers start from a fresh interpreter rather than a fork of a
+    # process that may hold threads and open documents
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    executor = ProcessPoolExecutor(
+        max_workers=min(workers, len(shards)),
+        mp_context=multiprocessing.get_context(method),
+        initializer=_init_worker,
+        initargs=(source,)
+    )
+    with executor:
+        futures = [
+            executor.submit(
+                _redact_shard, first, last,
+                {number: words for number, words in ocr_words.items() if first <= number <= last}
+            )
+            for first, last in shards
+        ]
+
+        # Shards are merged in page order as they come in
+        doc = fitz.open()
+        matches = 0
+        links = []
+        try:
+            for future in futures:
+                data, shard_matches, shard_links = future.result()
+                with fitz.open(stream=data, filetype="pdf") as shard:
+                    doc.insert_pdf(shard)
+                matches += shard_matches
+                links += shard_links
+
+            for number, link in links:
+                page = doc[number]
+                # get_links() reports rotated coordinates, insert_link()
+                # takes unrotated ones
+                page.insert_link({**link, "from": link["from"] * page.derotation_matrix})
+
+            # Document-level data does not travel with the pages
+            with _open_source(source) as src:
+                doc.set_metadata(src.metadata)
+                doc.set_toc(src.get_toc(simple=False))
+                doc.set_page_labels(src.get_page_labels())
+        except BaseException:
+            doc.close()
+            raise
+
+    return doc, matches
+
+
+def _redact_document(source, workers, ocr_words):
+    """
+    Returns (redacted document, number of matches); the caller closes it.
+    """
+    workers = redact_workers(workers)
+    ocr_words = ocr_words or {}
+    doc = _open_source(source)
+
+    if workers > 1 and doc.page_count >= PARALLEL_MIN_PAGES and _shardable(doc):
+        page_count = doc.page_count
+        doc.close()
+        return _redact_parallel(source, page_count, workers, ocr_words)
+
+    matches = 0
+    try:
+        for number, page in enumerate(doc):
+            matches += redact_page(page, ocr_words.get(number))
+    except BaseException:
+        doc.close()
+        raise
+
+    return doc, matches
+
 
 def redact_pdf(
     input_pdf_path: str,
-    output_pdf_path: str
+    output_pdf_path: str,
+    workers: int = None,
+    ocr_words: dict = None
 ):
-    doc = fitz.open(input_pdf_path)
+    """
+    Redacts the PII in a PDF's text layer and, for the pages in
+    `ocr_words` ({page number: words in points}, from the OCR at upload),
+    in their scanned images. Long documents are split into page ranges
+    redacted in parallel by `workers` processes (default
+    PDF_REDACT_WORKERS); the result has the same pages, links and page
+    labels as a serial run. Documents with named destinations, embedded
+    files or form fields are always redacted serially. Returns the number
+    of matches.
+    """
+    doc, matches = _redact_document(input_pdf_path, workers, ocr_words)
+    try:
+        doc.save(output_pdf_path)
+    finally:
+        doc.close()
 
-    for page in doc:
-        page_text = page.get_text("text")
+    return matches
 
-        for label, pattern in PII_PATTERNS.items():
-            matches = re.findall(pattern, page_text)
 
-            for match in matches:
-                match_str = match if isinstance(match, str) else match[0]
+def redact_pdf_bytes(pdf, workers=None, ocr_words=None, garbage=3, deflate=True):
+    """
+    redact_pdf for a PDF in memory: `pdf` is bytes or a binary file
+    object. Returns (redacted PDF bytes, number of matches). Nothing is
+    written to disk. The output is compacted: garbage=3 drops unused and
+    duplicate objects (the text and images redaction removed) and deflate
+    compresses streams.
+    """
+    if hasattr(pdf, "read"):
+        pdf = pdf.read()
 
-                # Find where this text appears on the page
-                text_instances = page.search_for(match_str)
+    doc, matches = _redact_document(bytes(pdf), workers, ocr_words)
+    try:
+        return doc.tobytes(garbage=garbage, deflate=deflate), matches
+    finally:
+        doc.close()
 
-                if not text_instances:
-                    continue
 
-                for inst in text_instances:
-                    page.add_redact_annot(inst, fill=(0, 0, 0))
+def redact_image(image_bytes, words, image_format="png"):
+    """
+    Blacks out the PII in a PNG or JPEG using its OCR word boxes (in
+    pixels). Returns (image bytes in `image_format`, number of matches).
+    """
+    pix = fitz.Pixmap(image_bytes)
+    if pix.colorspace and pix.colorspace.n == 4:
+        # CMYK JPEGs: black is not all zeros there
+        pix = fitz.Pixmap(fitz.csRGB, pix)
 
-        # Apply all redactions on this page
-        page.apply_redactions()
+    black = (0,) * (pix.n - pix.alpha) + (255,) * pix.alpha
+
+    boxes, matches = pii_word_boxes(words)
+    for x0, y0, x1, y1 in boxes:
+        rect = fitz.IRect(math.floor(x0), math.floor(y0), math.ceil(x1), math.ceil(y1)) & pix.irect
+        if not rect.is_empty:
+            pix.set_rect(rect, black)
 
-    doc.save(output_pdf_path)
-    doc.close()
+    if image_format in ("jpg", "jpeg"):
+        return pix.tobytes("jpg", jpg_quality=95), matches
+    return pix.tobytes("png"), matches
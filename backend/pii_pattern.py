@@ -1,3 +1,5 @@
+import re
+
 PII_PATTERNS = {
     "EMAIL": r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+",
     
@@ -9,3 +11,35 @@ PII_PATTERNS = {
     
     "DOB": r"\b(\d{2}[/-]\d{2}[/-]\d{4}|\d{4}[/-]\d{2}[/-]\d{2})\b"
 }
+
+
+# Compiled once. Each pattern scans the text on its own: in a single
+# alternation the first match consumes its characters, so an overlapping
+# match of another pattern ("15-86-3426 49814882": a DOB, then an Aadhaar
+# number sharing "3426") would be missed.
+PII_REGEXES = {label: re.compile(pattern) for label, pattern in PII_PATTERNS.items()}
+
+
+def find_pii(text: str):
+    """
+    Yields (label, start, end) for each PII span in `text`, in order.
+    Overlapping matches are merged into one span, labelled by the match
+    that starts first.
+    """
+    matches = sorted(
+        (match.start(), match.end(), label)
+        for label, regex in PII_REGEXES.items()
+        for match in regex.finditer(text)
+    )
+
+    span = None
+    for start, end, label in matches:
+        if span is not None and start < span[2]:
+            span[2] = max(span[2], end)
+            continue
+        if span is not None:
+            yield tuple(span)
+        span = [label, start, end]
+
+    if span is not None:
+        yield tuple(span)
@@ -1,5 +1,4 @@
-import re
-from pii_pattern import PII_PATTERNS
+from pii_pattern import find_pii
 
 REDACTION_TOKEN = "████████"
 
@@ -7,9 +6,12 @@ def redact_text(text: str) -> str:
     if not text:
         return text
 
-    redacted = text
+    # Overlapping matches come back as one span and get one token
+    parts = []
+    position = 0
+    for _, start, end in find_pii(text):
+        parts += (text[position:start], REDACTION_TOKEN)
+        position = end
+    parts.append(text[position:])
 
-    for label, pattern in PII_PATTERNS.items():
-        redacted = re.sub(pattern, REDACTION_TOKEN, redacted)
-
-    return redacted
+    return "".join(parts)
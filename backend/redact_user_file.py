@@ -1,14 +1,101 @@
 import sys
 import json
 import os
-import tempfile
-from google.cloud import storage
-from crypto_utils import decrypt_file_aes, derive_file_key
-from pdf_redactor import redact_pdf
-from dotenv import load_dotenv
+import cas
+import ocr_cache
+from concurrent.futures import ThreadPoolExecutor
+from container import ContainerError
+from crypto_utils import derive_file_key
+from pdf_redactor import redact_image, redact_pdf_bytes
+from resources import get_bucket
+from storage_utils import document_format, read_decrypted_bytes, upload_encrypted_bytes
+
+IMAGE_TYPES = {".png": ("png", "image/png"), ".jpg": ("jpg", "image/jpeg"), ".jpeg": ("jpg", "image/jpeg")}
+
+class RedactionError(Exception):
+    pass
+
+def redact_image_data(filename, data, words):
+    """
+    Redacts an uploaded PNG/JPEG from the word boxes its OCR stored.
+    """
+    image_format, _ = IMAGE_TYPES[os.path.splitext(filename)[1].lower()]
+
+    if words is None or words["unit"] != "px":
+        raise RedactionError(f"No OCR word boxes stored for {filename}; upload it again to redact it")
+
+    redacted_data, _ = redact_image(data, words["pages"].get(0, []), image_format)
+    return redacted_data
+
+def save_redacted(bucket, user_id, output_filename, redacted_data, save_path):
+    """
+    Writes the redacted file to `save_path` while an encrypted backup
+    copy is uploaded to documents/<user_id>/redacted/<output_filename>.enc,
+    apart from the user's own documents so it can never replace one of
+    them (an upload named like the output, e.g. x_redacted.pdf).
+    """
+    output_blob = bucket.blob(f"documents/{user_id}/redacted/{output_filename}.enc")
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        upload = executor.submit(
+            upload_encrypted_bytes, output_blob, redacted_data, derive_file_key(output_filename)
+        )
+
+        with open(save_path, 'wb') as f:
+            f.write(redacted_data)
+
+        upload.result()
+
+def redact_file(user_id, filename, save_path):
+    bucket = get_bucket()
+
+    # Download encrypted file from GCS
+    encrypted_blob_path = f"documents/{user_id}/{filename}.enc"
+    blob = bucket.blob(encrypted_blob_path)
+
+    if not blob.exists():
+        raise RedactionError(f"File not found: {filename}")
+
+    # Check the encryption format from blob metadata
+    blob.reload()
+    ocr_digest = cas.ocr_digest(bucket, blob)
+    try:
+        # A reference resolves to the shared content and its key
+        blob, key = cas.resolve(bucket, blob, filename)
+        document_format(blob)
+    except (ContainerError, FileNotFoundError) as e:
+        raise RedactionError(str(e)) from e
+
+    base_name, extension = os.path.splitext(filename)
+
+    try:
+        # Download and decrypt; the plaintext stays in memory throughout
+        decrypted_data = read_decrypted_bytes(blob, key)
+
+        # Word boxes from the OCR at upload, for scanned pages and images
+        words = ocr_cache.lookup_words(ocr_digest) if ocr_digest else None
+
+        if extension.lower() in IMAGE_TYPES:
+            redacted_data = redact_image_data(filename, decrypted_data, words)
+            output_filename = f"{base_name}_redacted{extension}"
+        else:
+            redacted_data, _ = redact_pdf_bytes(
+                decrypted_data,
+                ocr_words=words["pages"] if words and words["unit"] == "pt" else None
+            )
+            output_filename = f"{base_name}_redacted.pdf"
+
+        # Encrypt and back up to GCS while saving locally
+        save_redacted(bucket, user_id, output_filename, redacted_data, save_path)
 
-load_dotenv()
-BUCKET_NAME = os.getenv("BUCKET_NAME")
+    except Exception as e:
+        raise RedactionError(f"Redaction failed: {str(e)}") from e
+
+    return {
+        "success": True,
+        "message": f"File redacted successfully and saved to {save_path}",
+        "filename": output_filename
+    }
 
 def main():
     if len(sys.argv) != 4:
@@ -20,84 +107,11 @@ def main():
     save_path = sys.argv[3]
 
     try:
-        # Initialize GCS client
-        client = storage.Client()
-        bucket = client.bucket(BUCKET_NAME)
-
-        # Download encrypted file from GCS
-        encrypted_blob_path = f"documents/{user_id}/{filename}.enc"
-        blob = bucket.blob(encrypted_blob_path)
-        
-        if not blob.exists():
-            print(json.dumps({"error": f"File not found: {filename}"}))
-            sys.exit(1)
-
-        # Get IV from blob metadata
-        blob.reload()
-        iv_hex = blob.metadata.get("iv") if blob.metadata else None
-        if not iv_hex:
-            print(json.dumps({"error": "IV not found in file metadata"}))
-            sys.exit(1)
-
-        # Download encrypted file
-        encrypted_data = blob.download_as_bytes()
-        file_iv = bytes.fromhex(iv_hex)
-
-        try:
-            # Decrypt file using the filename-based key
-            key = derive_file_key(filename)
-            decrypted_data = decrypt_file_aes(encrypted_data, key, file_iv)
-
-            # Save to temp file for redaction
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_decrypted:
-                temp_decrypted.write(decrypted_data)
-                temp_decrypted_path = temp_decrypted.name
-
-            # Redact the PDF
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_redacted:
-                temp_redacted_path = temp_redacted.name
-
-            redact_pdf(
-                input_pdf_path=temp_decrypted_path,
-                output_pdf_path=temp_redacted_path
-            )
-
-            # Read redacted file
-            with open(temp_redacted_path, 'rb') as f:
-                redacted_data = f.read()
+        print(json.dumps(redact_file(user_id, filename, save_path)))
 
-            # Save to the specified location
-            with open(save_path, 'wb') as f:
-                f.write(redacted_data)
-
-            # Create output filename for GCS backup
-            base_name = os.path.splitext(filename)[0]
-            output_filename = f"{base_name}_redacted.pdf"
-            output_blob_path = f"documents/{user_id}/{output_filename}"
-            
-            # Also save to GCS as backup
-            output_blob = bucket.blob(output_blob_path)
-            output_blob.upload_from_string(redacted_data, content_type="application/pdf")
-
-            # Clean up temp files
-            os.unlink(temp_decrypted_path)
-            os.unlink(temp_redacted_path)
-
-            print(json.dumps({
-                "success": True,
-                "message": f"File redacted successfully and saved to {save_path}",
-                "filename": output_filename
-            }))
-
-        except Exception as e:
-            # Clean up temp files on error
-            if 'temp_decrypted_path' in locals() and os.path.exists(temp_decrypted_path):
-                os.unlink(temp_decrypted_path)
-            if 'temp_redacted_path' in locals() and os.path.exists(temp_redacted_path):
-                os.unlink(temp_redacted_path)
-            
-            print(json.dumps({"error": f"Redaction failed: {str(e)}"}))
-            sys.exit(1)
+    except RedactionError as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
 
     except Exception as e:
         print(json.dumps({"error": f"Error: {str(e)}"}))
@@ -0,0 +1,114 @@
+import os
+import threading
+from pathlib import Path
+
+# Shared, lazily created clients.
+# A one-shot CLI only pays for what it touches; the worker keeps them warm.
+
+_lock = threading.RLock()
+_resources = {}
+_factories = {}
+
+
+def resource(name):
+    """
+    Registers a factory for a shared resource.
+    """
+    def register(factory):
+        _factories[name] = factory
+        return factory
+    return register
+
+
+def get_resource(name):
+    """
+    Returns the shared resource `name`, creating it on first use.
+    """
+    try:
+        return _resources[name]
+    except KeyError:
+        pass
+
+    with _lock:
+        if name not in _resources:
+            _resources[name] = _factories[name]()
+        return _resources[name]
+
+
+def reset_resources():
+    with _lock:
+        _resources.clear()
+
+
+@resource("env")
+def _load_env():
+    from dotenv import load_dotenv
+    load_dotenv(Path(__file__).resolve().parent / ".env")
+    return True
+
+
+def get_env(key, default=None):
+    get_resource("env")
+    return os.getenv(key, default)
+
+
+@resource("storage_client")
+def _storage_client():
+    from google.cloud import storage
+
+    creds_path = get_env("GOOGLE_APPLICATION_CREDENTIALS")
+    if not creds_path:
+        return storage.Client()
+
+    from google.oauth2 import service_account
+    creds = service_account.Credentials.from_service_account_file(creds_path)
+    return storage.Client(credentials=creds, project=creds.project_id)
+
+
+@resource("bucket")
+def _bucket():
+    bucket_name = get_env("BUCKET_NAME")
+    if not bucket_name:
+        raise RuntimeError("BUCKET_NAME not set")
+    return get_resource("storage_client").bucket(bucket_name)
+
+
+@resource("firebase_app")
+def _firebase_app():
+    import firebase_admin
+    from firebase_admin import credentials
+
+    cred = credentials.Certificate(get_env("FIREBASE_CREDENTIALS_PATH"))
+    return firebase_admin.initialize_app(cred)
+
+
+@resource("firestore")
+def _firestore():
+    # Metadata written by the upload pipeline (auth_utils) always goes to
+    # the securedocai project
+    from google.cloud import firestore
+    return firestore.Client(project="securedocai")
+
+
+@resource("project_firestore")
+def _project_firestore():
+    # db_utils follows GOOGLE_CLOUD_PROJECT, or the project of the
+    # credentials when it is not set
+    from google.cloud import firestore
+    return firestore.Client(project=get_env("GOOGLE_CLOUD_PROJECT"))
+
+
+@resource("master_secret")
+def _master_secret():
+    secret = get_env("MASTER_SECRET")
+    if not secret:
+        raise RuntimeError("MASTER_SECRET not set")
+    return secret.encode("utf-8")
+
+
+def get_bucket():
+    return get_resource("bucket")
+
+
+def get_bucket_name():
+    return get_bucket().name
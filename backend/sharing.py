@@ -1,9 +1,8 @@
 import sys
-import os
 import traceback
-from pathlib import Path
-from google.cloud import storage
-from dotenv import load_dotenv
+import cas
+from manifest import mark_pending, update_manifest
+from resources import get_bucket, get_env
 
 USER_1 = "FQvHMEXmkXMWM8kAFg4gZBo8qAr1"
 USER_2 = "62l7q2fMLQT5zEj4g8tVHM1GRHn2"
@@ -12,6 +11,63 @@ def die(msg):
     print(msg, file=sys.stderr)
     sys.exit(1)
 
+def share_peer(user_id):
+    # Decide source & destination users
+    if user_id == USER_1:
+        return USER_2
+    if user_id == USER_2:
+        return USER_1
+    raise ValueError("Invalid user_id")
+
+def share_file(user_id, filename):
+    source_user, dest_user = user_id, share_peer(user_id)
+
+    bucket = get_bucket()
+
+    # -------- COPY FILE --------
+    src_file = f"documents/{source_user}/{filename}.enc"
+    dst_file = f"documents/{dest_user}/shared/{filename}.enc"
+
+    src_blob = bucket.blob(src_file)
+    src_blob.reload()
+
+    # A reference is shared by copying the reference, not the content
+    if cas.is_reference(src_blob):
+        if cas.add_reference(bucket, dst_file, src_blob.metadata["cas"]) is None:
+            raise FileNotFoundError(f"Content missing for {filename}")
+
+    bucket.copy_blob(
+        src_blob,
+        bucket,
+        dst_file
+    )
+
+    # -------- COPY METADATA --------
+    src_meta = f"documents/{source_user}/meta/{filename}.enc"
+    dst_meta = f"documents/{dest_user}/meta/shared/{filename}.enc"
+
+    mark_pending(bucket, dest_user, filename)
+
+    bucket.copy_blob(
+        bucket.blob(src_meta),
+        bucket,
+        dst_meta
+    )
+
+    update_manifest(
+        bucket,
+        dest_user,
+        lambda manifest: manifest["shared"].__setitem__(
+            filename, {"filename": filename, "category": "Shared"}
+        ),
+        pending=[filename]
+    )
+
+    return {
+        "success": True,
+        "recipient": dest_user
+    }
+
 def main():
     if len(sys.argv) != 3:
         die("Usage: python sharing.py <user_id> <filename>")
@@ -19,45 +75,16 @@ def main():
     user_id = sys.argv[1]
     filename = sys.argv[2]
 
-    # Load env safely
-    base_dir = Path(__file__).resolve().parent
-    load_dotenv(base_dir / ".env")
-
-    BUCKET_NAME = os.getenv("BUCKET_NAME")
-    if not BUCKET_NAME:
+    if not get_env("BUCKET_NAME"):
         die("BUCKET_NAME not set")
 
-    # Decide source & destination users
-    if user_id == USER_1:
-        source_user, dest_user = USER_1, USER_2
-    elif user_id == USER_2:
-        source_user, dest_user = USER_2, USER_1
-    else:
-        die("Invalid user_id")
+    try:
+        share_peer(user_id)
+    except ValueError as e:
+        die(str(e))
 
     try:
-        client = storage.Client()
-        bucket = client.bucket(BUCKET_NAME)
-
-        # -------- COPY FILE --------
-        src_file = f"documents/{source_user}/{filename}.enc"
-        dst_file = f"documents/{dest_user}/shared/{filename}.enc"
-
-        bucket.copy_blob(
-            bucket.blob(src_file),
-            bucket,
-            dst_file
-        )
-
-        # -------- COPY METADATA --------
-        src_meta = f"documents/{source_user}/meta/{filename}.enc"
-        dst_meta = f"documents/{dest_user}/meta/shared/{filename}.enc"
-
-        bucket.copy_blob(
-            bucket.blob(src_meta),
-            bucket,
-            dst_meta
-        )
+        share_file(user_id, filename)
 
         print("SUCCESS: File and metadata shared")
 
@@ -0,0 +1,116 @@
+import io
+import os
+import tempfile
+from crypto_utils import decrypt_file_aes, decrypt_stream_aes
+from container import (
+    FORMAT,
+    ContainerError,
+    decrypt_container,
+    encrypt_to_container,
+    looks_like_container
+)
+
+# Resumable upload chunk; must be a multiple of 256 KiB.
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Ranged read size for downloads. Small enough that the first bytes reach
+# disk quickly, large enough to keep request overhead low.
+DOWNLOAD_CHUNK_SIZE = 2 * 1024 * 1024
+
+LEGACY_FORMAT = "cbc"
+
+
+def document_format(blob):
+    """
+    Returns FORMAT for segmented containers or LEGACY_FORMAT for single
+    AES-CBC objects. `blob.metadata` must already be loaded.
+    """
+    metadata = blob.metadata or {}
+
+    if metadata.get("format") == FORMAT:
+        return FORMAT
+    if "iv" in metadata:
+        return LEGACY_FORMAT
+
+    # Metadata lost (e.g. a copy made without it): sniff the header instead
+    if blob.size and looks_like_container(blob.download_as_bytes(start=0, end=3)):
+        return FORMAT
+
+    raise ContainerError("IV not found in file metadata")
+
+
+def upload_encrypted_file(blob, file_path, aes_key, metadata=None, **upload_kwargs):
+    """
+    Encrypts `file_path` segment by segment straight into a resumable upload
+    of `blob`. Memory use is bounded by UPLOAD_CHUNK_SIZE whatever the file size.
+    """
+    blob.metadata = {**(metadata or {}), "format": FORMAT}
+
+    with open(file_path, "rb") as src, \
+            blob.open("wb", chunk_size=UPLOAD_CHUNK_SIZE, ignore_flush=True, **upload_kwargs) as dst:
+        encrypt_to_container(src, dst, aes_key, os.fstat(src.fileno()).st_size)
+
+
+def upload_encrypted_bytes(blob, data, aes_key, metadata=None, **upload_kwargs):
+    """
+    upload_encrypted_file for data already in memory; the plaintext is
+    never written to disk.
+    """
+    blob.metadata = {**(metadata or {}), "format": FORMAT}
+
+    with blob.open("wb", chunk_size=UPLOAD_CHUNK_SIZE, ignore_flush=True, **upload_kwargs) as dst:
+        encrypt_to_container(io.BytesIO(data), dst, aes_key, len(data))
+
+
+def _decrypt_document_stream(blob, src, dst, aes_key):
+    if document_format(blob) == FORMAT:
+        decrypt_container(src, dst, aes_key)
+    else:
+        iv = bytes.fromhex(blob.metadata["iv"])
+        decrypt_stream_aes(src, dst, aes_key, iv, chunk_size=DOWNLOAD_CHUNK_SIZE)
+
+
+def download_decrypted_file(blob, aes_key, save_path):
+    """
+    Downloads `blob` with ranged reads, decrypting each chunk as it arrives
+    into a temporary file next to `save_path`. The file is renamed into place
+    only once decryption succeeds, so a failed or interrupted download never
+    leaves a truncated or corrupt `save_path` behind.
+
+    Works for both containers and legacy AES-CBC objects.
+    """
+    save_dir = os.path.dirname(os.path.abspath(save_path))
+    fd, part_path = tempfile.mkstemp(
+        dir=save_dir,
+        prefix=f".{os.path.basename(save_path)}.",
+        suffix=".part"
+    )
+
+    try:
+        with os.fdopen(fd, "wb") as dst, \
+                blob.open("rb", chunk_size=DOWNLOAD_CHUNK_SIZE) as src:
+            _decrypt_document_stream(blob, src, dst, aes_key)
+
+        os.replace(part_path, save_path)
+
+    except BaseException:
+        if os.path.exists(part_path):
+            os.unlink(part_path)
+        raise
+
+    return save_path
+
+
+def read_decrypted_bytes(blob, aes_key):
+    """
+    Downloads and decrypts a whole document into memory.
+    """
+    encrypted_data = blob.download_as_bytes()
+
+    if document_format(blob) == LEGACY_FORMAT:
+        return decrypt_file_aes(encrypted_data, aes_key, bytes.fromhex(blob.metadata["iv"]))
+
+    plaintext = io.BytesIO()
+    decrypt_container(io.BytesIO(encrypted_data), plaintext, aes_key)
+    return plaintext.getvalue()
+
@@ -1,28 +1,62 @@
 import re
-from collections import defaultdict
+import heapq
+from itertools import chain
+from collections import Counter
+
+# Bump when a change alters the summaries produced; stored summaries from
+# other versions are regenerated
+SUMMARIZER_VERSION = 1
+
+WORD_PATTERN = re.compile(r'\b[a-zA-Z]{3,}\b')
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+')
+
+# A sentence sharing more than this fraction of its words with an already
+# selected sentence is skipped
+REDUNDANCY_THRESHOLD = 0.6
 
 
 def split_sentences(text: str):
     """
     Simple and robust sentence splitter.
     """
-    return re.split(r'(?<=[.!?])\s+', text.strip())
+    return SENTENCE_BREAK.split(text.strip())
 
 
 def is_redundant(sentence: str, selected_sentences: list) -> bool:
     """
     Checks if a sentence is too similar to already selected sentences.
     """
-    sent_words = set(sentence.lower().split())
+    return _overlaps(set(sentence.lower().split()), [set(s.lower().split()) for s in selected_sentences])
+
 
-    for s in selected_sentences:
-        overlap = sent_words & set(s.lower().split())
-        if sent_words and (len(overlap) / len(sent_words)) > 0.6:
+def _overlaps(sent_words: set, selected_word_sets: list) -> bool:
+    for words in selected_word_sets:
+        overlap = sent_words & words
+        if sent_words and (len(overlap) / len(sent_words)) > REDUNDANCY_THRESHOLD:
             return True
 
     return False
 
 
+def select_sentences(ranked, max_sentences: int) -> list:
+    """
+    Takes sentences from `ranked` (best first) until `max_sentences`
+    non-redundant ones are selected.
+    """
+    selected = []
+    selected_word_sets = []
+
+    for sent in ranked:
+        sent_words = set(sent.lower().split())
+        if not _overlaps(sent_words, selected_word_sets):
+            selected.append(sent)
+            selected_word_sets.append(sent_words)
+        if len(selected) == max_sentences:
+            break
+
+    return selected
+
+
 def summarize_text(text: str, max_sentences: int = 3) -> str:
     """
     Extractive summarization using word frequency + position bias + redundancy removal.
@@ -39,33 +73,32 @@ def summarize_text(text: str, max_sentences: int = 3) -> str:
         return text
 
     # -----------------------------
-    # 1️⃣ Word frequency analysis
+    # 1️⃣ Tokenize once; word frequency analysis
     # -----------------------------
-    word_freq = defaultdict(int)
+    sentence_words = [WORD_PATTERN.findall(sentence.lower()) for sentence in sentences]
 
-    words = re.findall(r'\b[a-zA-Z]{3,}\b', text.lower())
-    for word in words:
-        word_freq[word] += 1
+    counts = Counter(chain.from_iterable(sentence_words))
 
-    if not word_freq:
+    if not counts:
         return text
 
-    max_freq = max(word_freq.values())
-    for word in word_freq:
-        word_freq[word] /= max_freq
+    max_freq = max(counts.values())
+    word_freq = {word: count / max_freq for word, count in counts.items()}
 
     # -----------------------------
     # 2️⃣ Sentence scoring
     # -----------------------------
+    # Repeated sentences share one entry: the score of the last occurrence,
+    # ranked at the position of the first
     sentence_scores = {}
 
-    for idx, sentence in enumerate(sentences):
-        sentence_words = re.findall(r'\b[a-zA-Z]{3,}\b', sentence.lower())
-        if not sentence_words:
+    for idx, (sentence, words) in enumerate(zip(sentences, sentence_words)):
+        if not words:
             continue
 
-        word_score = sum(word_freq.get(word, 0) for word in sentence_words)
-        avg_word_score = word_score / len(sentence_words)
+        # Summed left to right, as before, so scores are bit-identical
+        word_score = sum(map(word_freq.__getitem__, words))
+        avg_word_score = word_score / len(words)
 
         # Position bias (earlier sentences are more important)
         position_weight = 1 / (idx + 1)
@@ -76,26 +109,141 @@ def summarize_text(text: str, max_sentences: int = 3) -> str:
         return text
 
     # -----------------------------
-    # 3️⃣ Rank sentences
+    # 3️⃣ Rank sentences lazily
     # -----------------------------
-    ranked_sentences = sorted(
-        sentence_scores,
-        key=sentence_scores.get,
-        reverse=True
-    )
+    # Heap ordered by score, then first occurrence (the order a stable sort
+    # gives); only as many sentences as selection needs are popped
+    heap = [(-score, order, sentence) for order, (sentence, score) in enumerate(sentence_scores.items())]
+    heapq.heapify(heap)
+
+    def ranked():
+        while heap:
+            yield heapq.heappop(heap)[2]
 
     # -----------------------------
     # 4️⃣ Select non-redundant sentences
     # -----------------------------
-    selected = []
-
-    for sent in ranked_sentences:
-        if not is_redundant(sent, selected):
-            selected.append(sent)
-        if len(selected) == max_sentences:
-            break
+    selected = set(select_sentences(ranked(), max_sentences))
 
     # Preserve original document order
     summary = " ".join(s for s in sentences if s in selected)
 
     return summary
+
+
+class StreamingSummarizer:
+    """
+    Summarizes a document fed one page at a time.
+
+    Keeps running word counts and at most `max_candidates` sentences, so
+    memory follows the vocabulary and summary size rather than the
+    document size. Candidates are re-ranked with the running counts
+    whenever the set doubles; the final ranking uses the complete counts
+    exactly as summarize_text does, so while no candidate has been dropped
+    the result is the same as summarize_text on the joined pages.
+    """
+
+    def __init__(self, max_sentences: int = 3, max_candidates: int = 200):
+        self.max_sentences = max_sentences
+        self.max_candidates = max(max_candidates, max_sentences)
+
+        self.counts = Counter()
+        # sentence -> {"words", "first", "last", "occurrences"}
+        self.candidates = {}
+
+        self._carry = ""
+        self._index = 0
+        # Short documents, and ones without words, are returned unchanged
+        # as summarize_text does; their text is kept until the document is
+        # known to be neither
+        self._head = []
+        self._head_chars = 0
+
+    def add_page(self, page: str):
+        if self._head is not None:
+            self._head.append(page)
+            self._head_chars += len(page)
+
+        # A sentence can run over the page break
+        buffer = self._carry + page if self._carry else page.lstrip()
+        parts = SENTENCE_BREAK.split(buffer)
+        self._carry = parts.pop()
+
+        for sentence in parts:
+            self._add_sentence(sentence)
+
+    def _add_sentence(self, sentence: str):
+        idx = self._index
+        self._index += 1
+
+        words = WORD_PATTERN.findall(sentence.lower())
+        self.counts.update(words)
+
+        if words:
+            candidate = self.candidates.get(sentence)
+            if candidate is not None:
+                candidate["last"] = idx
+                candidate["occurrences"].append(idx)
+            else:
+                self.candidates[sentence] = {"words": words, "first": idx, "last": idx, "occurrences": [idx]}
+
+                if len(self.candidates) >= 2 * self.max_candidates:
+                    self._prune()
+
+        if (self._head is not None and self.candidates
+                and self._head_chars >= 100 and self._index > self.max_sentences):
+            self._head = None
+
+    def _scores(self):
+        max_freq = max(self.counts.values())
+        word_freq = {word: count / max_freq for word, count in self.counts.items()}
+
+        return {
+            sentence: sum(map(word_freq.__getitem__, c["words"])) / len(c["words"]) + 1 / (c["last"] + 1)
+            for sentence, c in self.candidates.items()
+        }
+
+    def _prune(self):
+        scores = self._scores()
+        keep = heapq.nlargest(
+            self.max_candidates,
+            self.candidates,
+            key=lambda sentence: (scores[sentence], -self.candidates[sentence]["first"])
+        )
+        self.candidates = {sentence: self.candidates[sentence] for sentence in keep}
+
+    def summary(self) -> str:
+        if self._carry.strip():
+            self._add_sentence(self._carry.rstrip())
+        self._carry = ""
+
+        if self._head is not None:
+            return summarize_text("".join(self._head), self.max_sentences)
+
+        scores = self._scores()
+        heap = [(-scores[sentence], c["first"], sentence) for sentence, c in self.candidates.items()]
+        heapq.heapify(heap)
+
+        def ranked():
+            while heap:
+                yield heapq.heappop(heap)[2]
+
+        selected = select_sentences(ranked(), self.max_sentences)
+
+        # Original order, repeated sentences included
+        occurrences = sorted(
+            (idx, sentence) for sentence in selected
+            for idx in self.candidates[sentence]["occurrences"]
+        )
+        return " ".join(sentence for _, sentence in occurrences)
+
+
+def summarize_pages(pages, max_sentences: int = 3, max_candidates: int = 200) -> str:
+    """
+    Summarizes an iterable of page texts without joining them, e.g. the
+    pages yielded by ocr_utils.iter_pdf_pages.
+    """
+    summarizer = StreamingSummarizer(max_sentences, max_candidates)
+    for page in pages:
+        summarizer.add_page(page)
+    return summarizer.summary()
@@ -0,0 +1,115 @@
+"""
+Summaries computed at upload, stored next to the document as
+
+    documents/<user_id>/summary/<filename>.enc
+        {"summary": ..., "preview": first 500 characters of the text,
+         "version": SUMMARIZER_VERSION}
+
+encrypted under a per-user key derived from MASTER_SECRET. Serving a
+summary is one small read; a record from another summarizer version is
+treated as missing and regenerated.
+"""
+import json
+from crypto_utils import derive_file_key, encrypt_file_aes, decrypt_file_aes
+from summarizer import SUMMARIZER_VERSION, summarize_pages, summarize_text
+
+PREVIEW_CHARS = 500
+SUMMARY_SENTENCES = 3
+
+
+def summary_path(user_id, filename):
+    return f"documents/{user_id}/summary/{filename}.enc"
+
+
+def _summary_key(user_id):
+    return derive_file_key(f"summary:{user_id}")
+
+
+def build_summary(extracted_text):
+    """
+    Returns the summary record for a document's text, or None when there
+    is no text to summarize.
+    """
+    if not extracted_text or not extracted_text.strip():
+        return None
+
+    return {
+        "summary": summarize_text(extracted_text, max_sentences=SUMMARY_SENTENCES),
+        "preview": extracted_text[:PREVIEW_CHARS],
+        "version": SUMMARIZER_VERSION,
+    }
+
+
+def build_page_summary(pages):
+    """
+    Like build_summary, for a document read page by page (e.g. from
+    ocr_utils.iter_pdf_text): each page is summarized as it arrives, while
+    the next ones are still being read. Returns (record, extracted_text).
+    """
+    collected = []
+
+    def collect():
+        for page in pages:
+            collected.append(page)
+            yield page
+
+    summary = summarize_pages(collect(), max_sentences=SUMMARY_SENTENCES)
+    extracted_text = "".join(collected)
+
+    if not extracted_text.strip():
+        return None, extracted_text
+
+    return {
+        "summary": summary,
+        "preview": extracted_text[:PREVIEW_CHARS],
+        "version": SUMMARIZER_VERSION,
+    }, extracted_text
+
+
+def is_current(record):
+    return bool(record) and record.get("version") == SUMMARIZER_VERSION
+
+
+def save_summary(bucket, user_id, filename, record):
+    encrypted, iv = encrypt_file_aes(
+        json.dumps(record).encode("utf-8"),
+        _summary_key(user_id)
+    )
+
+    blob = bucket.blob(summary_path(user_id, filename))
+    blob.metadata = {"iv": iv.hex(), "version": str(record["version"])}
+    blob.upload_from_string(encrypted)
+
+
+def load_summary(bucket, user_id, filename):
+    """
+    Returns the stored summary record, or None when it is missing,
+    unreadable or from another summarizer version.
+    """
+    blob = bucket.get_blob(summary_path(user_id, filename))
+    if blob is None or not blob.metadata or "iv" not in blob.metadata:
+        return None
+
+    # Version is in the object metadata, so an outdated record is not downloaded
+    if blob.metadata.get("version") != str(SUMMARIZER_VERSION):
+        return None
+
+    try:
+        record = json.loads(decrypt_file_aes(
+            blob.download_as_bytes(),
+            _summary_key(user_id),
+            bytes.fromhex(blob.metadata["iv"])
+        ).decode("utf-8"))
+    except Exception:
+        return None
+
+    return record if is_current(record) else None
+
+
+def delete_summary(bucket, user_id, filename):
+    from google.api_core.exceptions import NotFound
+
+    try:
+        bucket.blob(summary_path(user_id, filename)).delete()
+    except NotFound:
+        pass
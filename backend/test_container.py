@@ -0,0 +1,169 @@
+"""
+Checks for the sdac1 container format: header layout, nonces, round trips,
+and truncation and tamper detection.
+
+Run with:
+    python -m pytest test_container.py
+"""
+import io
+import os
+import struct
+import pytest
+from container import (
+    HEADER_SIZE,
+    MAGIC,
+    TAG_SIZE,
+    VERSION,
+    ContainerError,
+    Header,
+    _nonce,
+    decrypt_container,
+    encrypt_to_container,
+    looks_like_container
+)
+
+KEY = bytes(range(32))
+SEGMENT = 64
+
+
+def encrypt(data, key=KEY, segment_size=SEGMENT):
+    dst = io.BytesIO()
+    encrypt_to_container(io.BytesIO(data), dst, key, len(data), segment_size)
+    return dst.getvalue()
+
+
+def decrypt(blob, key=KEY):
+    dst = io.BytesIO()
+    decrypt_container(io.BytesIO(blob), dst, key)
+    return dst.getvalue()
+
+
+# -----------------------------
+# Layout
+# -----------------------------
+def test_header_layout():
+    data = os.urandom(200)
+    blob = encrypt(data)
+
+    magic, version, segment_size, plaintext_size, nonce_prefix, segment_count = \
+        struct.unpack(">4sB3xIQ8sI", blob[:HEADER_SIZE])
+
+    assert HEADER_SIZE == 32
+    assert magic == MAGIC and looks_like_container(blob)
+    assert version == VERSION
+    assert (segment_size, plaintext_size, segment_count) == (SEGMENT, 200, 4)
+    assert len(nonce_prefix) == 8
+
+    # Full segments plus a short last one, each with its tag
+    assert len(blob) == HEADER_SIZE + 200 + 4 * TAG_SIZE
+
+
+def test_segment_offsets_and_lengths():
+    header = Header(SEGMENT, 200, b"\0" * 8)
+
+    assert [header.segment_length(i) for i in range(4)] == [64, 64, 64, 8]
+    assert header.segment_offset(0) == HEADER_SIZE
+    assert header.segment_offset(3) == HEADER_SIZE + 3 * (SEGMENT + TAG_SIZE)
+
+
+def test_nonce_is_prefix_and_segment_index():
+    header = Header(SEGMENT, 200, b"ABCDEFGH")
+
+    assert _nonce(header, 0) == b"ABCDEFGH\0\0\0\0"
+    assert _nonce(header, 3) == b"ABCDEFGH\0\0\0\x03"
+
+
+def test_nonce_prefix_differs_per_object():
+    assert encrypt(b"same")[16:24] != encrypt(b"same")[16:24]
+
+
+@pytest.mark.parametrize("size", [0, 1, SEGMENT - 1, SEGMENT, SEGMENT + 1, 3 * SEGMENT, 1000])
+def test_round_trip(size):
+    data = os.urandom(size)
+    assert decrypt(encrypt(data)) == data
+
+
+def test_empty_plaintext_has_one_segment():
+    blob = encrypt(b"")
+    assert Header.unpack(blob).segment_count == 1
+    assert len(blob) == HEADER_SIZE + TAG_SIZE
+
+
+# -----------------------------
+# Integrity
+# -----------------------------
+def test_wrong_key_fails():
+    with pytest.raises(ContainerError):
+        decrypt(encrypt(b"x" * 100), key=bytes(32))
+
+
+def test_truncated_segment_fails():
+    blob = encrypt(os.urandom(200))
+    with pytest.raises(ContainerError, match="Truncated segment"):
+        decrypt(blob[:-1])
+
+
+def test_dropped_last_segment_fails():
+    blob = encrypt(os.urandom(3 * SEGMENT))
+    with pytest.raises(ContainerError):
+        decrypt(blob[:Header.unpack(blob).segment_offset(2)])
+
+
+def test_truncated_header_fails():
+    with pytest.raises(ContainerError, match="Truncated container header"):
+        decrypt(encrypt(b"abc")[:HEADER_SIZE - 1])
+
+
+def test_bad_magic_and_version_fail():
+    blob = encrypt(b"abc")
+
+    with pytest.raises(ContainerError, match="Not an encrypted container"):
+        decrypt(b"XXXX" + blob[4:])
+    with pytest.raises(ContainerError, match="Unsupported container version"):
+        decrypt(blob[:4] + bytes([VERSION + 1]) + blob[5:])
+
+
+def test_inconsistent_segment_count_fails():
+    blob = encrypt(os.urandom(200))
+    with pytest.raises(ContainerError, match="Corrupt container header"):
+        decrypt(blob[:28] + struct.pack(">I", 5) + blob[32:])
+
+
+def test_tampered_header_fails_authentication():
+    # The reserved bytes are not parsed, but the header is the associated
+    # data of every segment
+    blob = bytearray(encrypt(os.urandom(200)))
+    blob[5] ^= 1
+    with pytest.raises(ContainerError, match="failed authentication"):
+        decrypt(bytes(blob))
+
+
+def test_flipped_ciphertext_bit_fails():
+    blob = bytearray(encrypt(os.urandom(200)))
+    blob[HEADER_SIZE + SEGMENT + TAG_SIZE + 5] ^= 1
+    with pytest.raises(ContainerError, match="Segment 1 failed authentication"):
+        decrypt(bytes(blob))
+
+
+def test_swapped_segments_fail():
+    blob = encrypt(os.urandom(3 * SEGMENT))
+    size = SEGMENT + TAG_SIZE
+    first, second = blob[HEADER_SIZE:HEADER_SIZE + size], blob[HEADER_SIZE + size:HEADER_SIZE + 2 * size]
+    swapped = blob[:HEADER_SIZE] + second + first + blob[HEADER_SIZE + 2 * size:]
+    with pytest.raises(ContainerError, match="Segment 0 failed authentication"):
+        decrypt(swapped)
+
+
+def test_segment_moved_between_objects_fails():
+    a = encrypt(os.urandom(200))
+    b = encrypt(os.urandom(200))
+    with pytest.raises(ContainerError):
+        decrypt(a[:HEADER_SIZE] + b[HEADER_SIZE:])
+
+
+def test_writer_rejects_wrong_size():
+    with pytest.raises(ContainerError):
+        encrypt_to_container(io.BytesIO(b"abc"), io.BytesIO(), KEY, 4, SEGMENT)
+    with pytest.raises(ContainerError):
+        encrypt_to_container(io.BytesIO(b"abcde"), io.BytesIO(), KEY, 4, SEGMENT)
+
@@ -0,0 +1,111 @@
+"""
+Checks for the per-user manifest: rebuilding it from meta blobs and
+updating it, including filenames that contain ".enc".
+
+Run with:
+    python -m pytest test_manifest.py
+"""
+import itertools
+import pytest
+from google.api_core.exceptions import NotFound, PreconditionFailed
+import resources
+from crypto_utils import encrypt_metadata
+from manifest import _filename_from_blob, get_manifest, update_manifest
+
+USER = "u"
+
+_generations = itertools.count(1)
+
+
+class MemoryBlob:
+
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        stored = bucket.objects.get(name)
+        self.metadata = dict(stored["metadata"]) if stored else None
+        self.generation = stored["generation"] if stored else None
+        self.time_created = None
+
+    def upload_from_string(self, data, if_generation_match=None, **kwargs):
+        stored = self.bucket.objects.get(self.name)
+        if if_generation_match is not None and (stored["generation"] if stored else 0) != if_generation_match:
+            raise PreconditionFailed(self.name)
+        self.generation = next(_generations)
+        self.bucket.objects[self.name] = {
+            "data": bytes(data), "metadata": dict(self.metadata or {}), "generation": self.generation
+        }
+
+    def download_as_bytes(self, if_generation_match=None):
+        stored = self.bucket.objects.get(self.name)
+        if stored is None:
+            raise NotFound(self.name)
+        if if_generation_match is not None and stored["generation"] != if_generation_match:
+            raise PreconditionFailed(self.name)
+        return stored["data"]
+
+    def delete(self, if_generation_match=None):
+        if self.name not in self.bucket.objects:
+            raise NotFound(self.name)
+        del self.bucket.objects[self.name]
+
+
+class MemoryBucket:
+
+    def __init__(self):
+        self.objects = {}
+
+    def blob(self, name):
+        return MemoryBlob(self, name)
+
+    def get_blob(self, name):
+        return MemoryBlob(self, name) if name in self.objects else None
+
+    def list_blobs(self, prefix="", delimiter=None):
+        return [
+            MemoryBlob(self, name) for name in sorted(self.objects)
+            if name.startswith(prefix) and not (delimiter and delimiter in name[len(prefix):])
+        ]
+
+
+@pytest.fixture
+def bucket(tmp_path, monkeypatch):
+    monkeypatch.setenv("MASTER_SECRET", "test-secret")
+    monkeypatch.setenv("METADATA_CACHE_PATH", str(tmp_path / "metadata_cache.sqlite3"))
+    resources.reset_resources()
+    yield MemoryBucket()
+    resources.reset_resources()
+
+
+def add_document(bucket, filename):
+    encrypted, iv = encrypt_metadata({"filename": filename, "category": "Bill", "user_id": USER})
+    blob = bucket.blob(f"documents/{USER}/meta/{filename}.enc")
+    blob.metadata = {"iv": iv.hex()}
+    blob.upload_from_string(encrypted)
+
+
+def test_filename_from_blob_strips_only_the_suffix():
+    assert _filename_from_blob(f"documents/{USER}/meta/a.pdf.enc") == "a.pdf"
+    assert _filename_from_blob(f"documents/{USER}/meta/a.enc.pdf.enc") == "a.enc.pdf"
+    assert _filename_from_blob(f"documents/{USER}/meta/shared/report.enc") == "report"
+
+
+def test_rebuild_keeps_filenames_containing_enc(bucket):
+    add_document(bucket, "a.pdf")
+    add_document(bucket, "a.enc.pdf")
+
+    manifest = get_manifest(bucket, USER, refresh=True)
+
+    assert sorted(manifest["documents"]) == ["a.enc.pdf", "a.pdf"]
+    assert manifest["documents"]["a.enc.pdf"]["filename"] == "a.enc.pdf"
+
+
+def test_update_removes_rebuilt_entry_by_its_filename(bucket):
+    add_document(bucket, "a.pdf")
+    add_document(bucket, "a.enc.pdf")
+    get_manifest(bucket, USER, refresh=True)
+
+    updated = update_manifest(bucket, USER, lambda manifest: manifest["documents"].pop("a.pdf", None))
+
+    assert sorted(updated["documents"]) == ["a.enc.pdf"]
+    assert sorted(get_manifest(bucket, USER)["documents"]) == ["a.enc.pdf"]
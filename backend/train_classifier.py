@@ -1,47 +1,253 @@
+"""
+Trains the document classifier from training_data/<label>/*.txt and writes
+the artifacts classifier.py loads:
+
+    models/tfidf_vectorizer.joblib
+    models/doc_classifier.joblib
+
+Default mode fits TF-IDF and logistic regression in memory.
+
+--streaming handles corpora that do not fit in memory. Files are read in
+batches by a thread pool, hashed into a fixed-size feature space (no
+vocabulary to hold) and fed to an SGD logistic regression with partial_fit.
+The model is checkpointed after every pass over the data (--resume
+continues from the last one), and a held-out share of the files, chosen by
+a hash of the path, is used for evaluation.
+
+Usage:
+    python train_classifier.py [--streaming] [--epochs 3] [--batch-size 5000]
+        [--workers 8] [--holdout 5] [--resume] [--data-dir training_data]
+        [--model-dir models]
+"""
 import os
+import sys
+import time
+import zlib
+import random
+import argparse
 import joblib
-
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
+from concurrent.futures import ThreadPoolExecutor
+from classifier import MODEL_FILE, VECTORIZER_FILE
 
 DATA_DIR = "training_data"
 MODEL_DIR = "models"
 
-os.makedirs(MODEL_DIR, exist_ok=True)
-
-texts = []
-labels = []
+CHECKPOINT_FILE = "checkpoint.joblib"
 
-for label in os.listdir(DATA_DIR):
-    label_dir = os.path.join(DATA_DIR, label)
-    if not os.path.isdir(label_dir):
-        continue
 
-    for file in os.listdir(label_dir):
-        if not file.endswith(".txt"):
+def list_corpus(data_dir):
+    """
+    Returns [(path, label)] for every .txt file, without reading them.
+    """
+    corpus = []
+    for label in sorted(os.listdir(data_dir)):
+        label_dir = os.path.join(data_dir, label)
+        if not os.path.isdir(label_dir):
             continue
 
-        with open(os.path.join(label_dir, file), "r", encoding="utf-8", errors="ignore") as f:
-            texts.append(f.read())
-            labels.append(label)
+        with os.scandir(label_dir) as entries:
+            corpus += [
+                (entry.path, label) for entry in entries
+                if entry.name.endswith(".txt") and entry.is_file()
+            ]
+    return corpus
+
+
+def read_text(path):
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return f.read()
+
+
+# -----------------------------
+# In-memory training
+# -----------------------------
+def train_in_memory(data_dir, model_dir):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+
+    corpus = list_corpus(data_dir)
+    texts = [read_text(path) for path, _ in corpus]
+    labels = [label for _, label in corpus]
+
+    print(f"Loaded {len(texts)} documents")
+
+    vectorizer = TfidfVectorizer(
+        max_features=5000,
+        stop_words="english"
+    )
+
+    X = vectorizer.fit_transform(texts)
+
+    classifier = LogisticRegression(
+        max_iter=1000,
+        class_weight="balanced"
+    )
+
+    classifier.fit(X, labels)
+
+    joblib.dump(vectorizer, os.path.join(model_dir, VECTORIZER_FILE))
+    joblib.dump(classifier, os.path.join(model_dir, MODEL_FILE))
+
+
+# -----------------------------
+# Streaming training
+# -----------------------------
+def is_holdout(path, holdout_percent):
+    # Stable across runs and machines, unlike hash()
+    return zlib.crc32(path.encode("utf-8")) % 100 < holdout_percent
+
+
+def iter_batches(corpus, batch_size, executor):
+    """
+    Yields (texts, labels) batches, reading the next batch's files while
+    the current one is being trained on.
+    """
+    def load(chunk):
+        return list(executor.map(read_text, [path for path, _ in chunk])), [label for _, label in chunk]
+
+    chunks = [corpus[i:i + batch_size] for i in range(0, len(corpus), batch_size)]
+    if not chunks:
+        return
+
+    with ThreadPoolExecutor(max_workers=1) as prefetch:
+        pending = prefetch.submit(load, chunks[0])
+        for chunk in chunks[1:]:
+            batch = pending.result()
+            pending = prefetch.submit(load, chunk)
+            yield batch
+        yield pending.result()
+
+
+def make_vectorizer():
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    # Stateless: nothing to fit, nothing that grows with the corpus
+    return HashingVectorizer(
+        n_features=2 ** 20,
+        stop_words="english",
+        alternate_sign=False,
+        norm="l2"
+    )
+
+
+def class_weights(labels):
+    """
+    Same weighting as class_weight="balanced", which partial_fit does not accept.
+    """
+    counts = {}
+    for label in labels:
+        counts[label] = counts.get(label, 0) + 1
+    return {label: len(labels) / (len(counts) * count) for label, count in counts.items()}
+
+
+def evaluate(vectorizer, model, corpus, batch_size, executor):
+    from sklearn.metrics import classification_report
+
+    expected, predicted = [], []
+    for texts, labels in iter_batches(corpus, batch_size, executor):
+        expected += labels
+        predicted += list(model.predict(vectorizer.transform(texts)))
+
+    return classification_report(expected, predicted, zero_division=0, output_dict=True)
+
+
+def train_streaming(data_dir, model_dir, epochs=3, batch_size=5000, workers=8,
+                    holdout_percent=5, resume=False, seed=42):
+    from sklearn.linear_model import SGDClassifier
+
+    corpus = list_corpus(data_dir)
+    train = [item for item in corpus if not is_holdout(item[0], holdout_percent)]
+    holdout = [item for item in corpus if is_holdout(item[0], holdout_percent)]
+    classes = sorted({label for _, label in corpus})
+    weights = class_weights([label for _, label in train])
+
+    print(f"Found {len(corpus)} documents: {len(train)} train, {len(holdout)} held out, "
+          f"{len(classes)} classes")
+
+    vectorizer = make_vectorizer()
+    checkpoint_path = os.path.join(model_dir, CHECKPOINT_FILE)
+
+    start_epoch = 0
+    if resume and os.path.exists(checkpoint_path):
+        checkpoint = joblib.load(checkpoint_path)
+        model, start_epoch = checkpoint["model"], checkpoint["epoch"]
+        print(f"Resuming after pass {start_epoch}")
+    else:
+        model = SGDClassifier(loss="log_loss", alpha=1e-6, random_state=seed)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for epoch in range(start_epoch, epochs):
+            # Files are grouped by label on disk; SGD needs them mixed
+            order = list(train)
+            random.Random(seed + epoch).shuffle(order)
+
+            started = time.perf_counter()
+            seen = 0
+            for texts, labels in iter_batches(order, batch_size, executor):
+                X = vectorizer.transform(texts)
+                model.partial_fit(X, labels, classes=classes,
+                                  sample_weight=[weights[label] for label in labels])
+                seen += len(texts)
+
+                elapsed = time.perf_counter() - started
+                print(f"  pass {epoch + 1}: {seen}/{len(order)} documents, "
+                      f"{seen / elapsed:.0f} docs/s", flush=True)
+
+            # Written atomically so an interrupted save keeps the previous pass
+            joblib.dump({"model": model, "epoch": epoch + 1}, checkpoint_path + ".tmp")
+            os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+            elapsed = time.perf_counter() - started
+            print(f"Pass {epoch + 1}/{epochs} done in {elapsed:.1f}s "
+                  f"({len(order) / elapsed if elapsed else 0:.0f} docs/s), checkpoint saved")
+
+        if holdout:
+            report = evaluate(vectorizer, model, holdout, batch_size, executor)
+            print(f"Held-out accuracy: {report['accuracy']:.4f}")
+            for label in classes:
+                if label in report:
+                    scores = report[label]
+                    print(f"  {label:20} precision {scores['precision']:.3f} "
+                          f"recall {scores['recall']:.3f} f1 {scores['f1-score']:.3f} "
+                          f"n={int(scores['support'])}")
+
+    joblib.dump(vectorizer, os.path.join(model_dir, VECTORIZER_FILE))
+    joblib.dump(model, os.path.join(model_dir, MODEL_FILE))
+
 
-print(f"Loaded {len(texts)} documents")
+def main():
+    parser = argparse.ArgumentParser(description="Train the document classifier")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--streaming", action="store_true", help="out-of-core training for large corpora")
+    parser.add_argument("--epochs", type=int, default=3, help="passes over the data (streaming)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="documents per partial_fit (streaming)")
+    parser.add_argument("--workers", type=int, default=8, help="file reading threads (streaming)")
+    parser.add_argument("--holdout", type=int, default=5, help="percent of files held out (streaming)")
+    parser.add_argument("--resume", action="store_true", help="continue from the last checkpoint (streaming)")
+    args = parser.parse_args()
 
-vectorizer = TfidfVectorizer(
-    max_features=5000,
-    stop_words="english"
-)
+    os.makedirs(args.model_dir, exist_ok=True)
 
-X = vectorizer.fit_transform(texts)
+    if not os.path.isdir(args.data_dir):
+        print(f"Training data not found: {args.data_dir}")
+        sys.exit(1)
 
-classifier = LogisticRegression(
-    max_iter=1000,
-    class_weight="balanced"
-)
+    if args.streaming:
+        train_streaming(
+            args.data_dir,
+            args.model_dir,
+            epochs=args.epochs,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            holdout_percent=args.holdout,
+            resume=args.resume
+        )
+    else:
+        train_in_memory(args.data_dir, args.model_dir)
 
-classifier.fit(X, labels)
+    print("Training complete. Models saved.")
 
-joblib.dump(vectorizer, f"{MODEL_DIR}/tfidf_vectorizer.joblib")
-joblib.dump(classifier, f"{MODEL_DIR}/doc_classifier.joblib")
 
-print("Training complete. Models saved.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+r"""
+Long-lived backend worker.
+
+Serves every backend operation over JSON-RPC 2.0 so the desktop app does not
+pay interpreter start-up, imports and client construction on every action.
+Messages are framed like LSP:
+
+    Content-Length: <n>\r\n
+    \r\n
+    <n bytes of UTF-8 JSON>
+
+Usage:
+    python worker.py                          # stdin / stdout
+    python worker.py --socket 127.0.0.1:8765  # local TCP socket
+
+Requests run concurrently on a thread pool, so responses may come back out of
+order; match them on "id". Progress output from the operations goes to stderr.
+"""
+import os
+import sys
+import json
+import inspect
+import argparse
+import threading
+import traceback
+import socketserver
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Protocol frames are written to a private copy of the original stdout.
+# File descriptor 1 itself is pointed at stderr before the operation modules
+# are imported, so nothing they print, at import time or later, from Python
+# or from C libraries, can end up in the frame stream.
+_protocol_out = None
+if __name__ == "__main__":
+    _protocol_out = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    sys.stdout.flush()
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+
+from main import process_file
+from list_metadat import list_metadata, clear_metadata_cache
+from list_shared_metadata import list_shared_metadata
+from download_user_file import download_file
+from download_shared_data import download_shared_file
+from sharing import share_file
+from delete_user_file import delete_file
+from get_summary import get_summary
+from redact_user_file import redact_file
+from resources import get_bucket
+from key_manager import get_key_manager
+import cas
+import ocr_cache
+
+
+def key_stats():
+    return get_key_manager().stats()
+
+
+METHODS = {
+    "upload": process_file,
+    "list": list_metadata,
+    "list_shared": list_shared_metadata,
+    "download": download_file,
+    "download_shared": download_shared_file,
+    "share": share_file,
+    "delete": delete_file,
+    "summarize": get_summary,
+    "redact": redact_file,
+    "clear_cache": clear_metadata_cache,
+    "key_stats": key_stats,
+    "ocr_stats": ocr_cache.stats,
+    "dedup_stats": cas.stats,
+}
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+DEFAULT_WORKERS = 8
+
+
+class FramingError(ValueError):
+    pass
+
+
+def read_message(stream):
+    """
+    Reads one framed message body. Returns None at end of stream and raises
+    FramingError for a malformed Content-Length header.
+    """
+    length = None
+    invalid = None
+
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+
+        line = line.strip()
+        if not line:
+            if length is None and invalid is None:
+                continue
+            break
+
+        name, _, value = line.decode("ascii", errors="replace").partition(":")
+        if name.strip().lower() == "content-length":
+            try:
+                length = int(value.strip())
+            except ValueError:
+                length = -1
+            if length < 0:
+                invalid = value.strip()
+
+    if invalid is not None:
+        raise FramingError(f"Invalid Content-Length: {invalid}")
+
+    body = stream.read(length)
+    if len(body) < length:
+        return None
+
+    return body
+
+
+def write_message(stream, payload):
+    body = json.dumps(payload).encode("utf-8")
+    stream.write(f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body)
+    stream.flush()
+
+
+def error_response(request_id, code, message):
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": {"code": code, "message": message}
+    }
+
+
+def dispatch(request):
+    """
+    Runs one request and returns its JSON-RPC response.
+    """
+    request_id = request.get("id")
+    method = request.get("method")
+    params = request.get("params", {})
+
+    if method == "ping":
+        return {"jsonrpc": "2.0", "id": request_id, "result": "pong"}
+
+    func = METHODS.get(method)
+    if func is None:
+        return error_response(request_id, METHOD_NOT_FOUND, f"Unknown method: {method}")
+
+    try:
+        if isinstance(params, dict):
+            bound = inspect.signature(func).bind(**params)
+        elif isinstance(params, list):
+            bound = inspect.signature(func).bind(*params)
+        else:
+            raise TypeError("params must be an object or array")
+    except TypeError as e:
+        return error_response(request_id, INVALID_PARAMS, str(e))
+
+    try:
+        result = func(*bound.args, **bound.kwargs)
+
+    except Exception as e:
+        traceback.print_exc()
+        return error_response(request_id, SERVER_ERROR, str(e))
+
+    return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+
+class Connection:
+    """
+    One framed JSON-RPC stream. Requests are handed to the shared executor
+    and answered as they finish.
+    """
+
+    def __init__(self, reader, writer, executor):
+        self.reader = reader
+        self.writer = writer
+        self.executor = executor
+        self._write_lock = threading.Lock()
+        self._pending = set()
+
+    def send(self, payload):
+        with self._write_lock:
+            write_message(self.writer, payload)
+
+    def _run(self, request):
+        response = dispatch(request)
+        if request.get("id") is not None:
+            self.send(response)
+
+    def serve(self):
+        """
+        Serves until EOF or a "shutdown" request. Returns True on shutdown.
+        """
+        shutdown = False
+
+        while True:
+            try:
+                body = read_message(self.reader)
+            except FramingError as e:
+                # The body length is unknown; answer and resync on the next header
+                self.send(error_response(None, PARSE_ERROR, str(e)))
+                continue
+            if body is None:
+                break
+
+            try:
+                request = json.loads(body)
+            except ValueError:
+                self.send(error_response(None, PARSE_ERROR, "Parse error"))
+                continue
+
+            if not isinstance(request, dict) or "method" not in request:
+                self.send(error_response(None, INVALID_REQUEST, "Invalid request"))
+                continue
+
+            if request["method"] == "shutdown":
+                shutdown = True
+                wait(list(self._pending))
+                self.send({"jsonrpc": "2.0", "id": request.get("id"), "result": True})
+                break
+
+            future = self.executor.submit(self._run, request)
+            self._pending.add(future)
+            future.add_done_callback(self._pending.discard)
+
+        wait(list(self._pending))
+        return shutdown
+
+
+def serve_stdio(executor):
+    reader = sys.stdin.buffer
+
+    if _protocol_out is not None:
+        writer = _protocol_out
+    else:
+        # Imported rather than run: claim stdout now
+        writer = sys.stdout.buffer
+        sys.stdout = sys.stderr
+
+    Connection(reader, writer, executor).serve()
+
+
+def serve_socket(address, executor):
+    host, _, port = address.rpartition(":")
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            if Connection(self.rfile, self.wfile, executor).serve():
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    socketserver.ThreadingTCPServer.allow_reuse_address = True
+    with socketserver.ThreadingTCPServer((host or "127.0.0.1", int(port)), Handler) as server:
+        sys.stdout = sys.stderr
+        print(f"WORKER: listening on {host or '127.0.0.1'}:{port}", flush=True)
+        server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SecureDocAI backend worker")
+    parser.add_argument("--socket", help="serve on HOST:PORT instead of stdin/stdout")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="maximum concurrent requests")
+    args = parser.parse_args()
+
+    # Warm the shared clients before the first request arrives.
+    try:
+        get_bucket()
+    except Exception:
+        traceback.print_exc()
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        if args.socket:
+            serve_socket(args.socket, executor)
+        else:
+            serve_stdio(executor)
+
+
+if __name__ == "__main__":
+    main()